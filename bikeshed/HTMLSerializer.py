@@ -2,8 +2,13 @@
 
 from __future__ import division, unicode_literals
 import re
+import string
 import StringIO
 from .htmlhelpers import childNodes, isElement, outerHTML, escapeHTML, escapeAttr
+from .messages import die
+
+# What to do with an element's contents, by tag name.
+NORMAL, VOID, RAW, OPAQUE = range(4)
 
 class HTMLSerializer(object):
 	inlineEls = frozenset(["a", "em", "strong", "small", "s", "cite", "q", "dfn", "abbr", "data", "time", "code", "var", "samp", "kbd", "sub", "sup", "i", "b", "u", "mark", "ruby", "bdi", "bdo", "span", "br", "wbr", "img", "meter", "progress", "[]"])
@@ -14,138 +19,115 @@ class HTMLSerializer(object):
 		self.tree = tree
 		self.opaqueEls = frozenset(opaqueElements)
 		self.blockEls = frozenset(blockElements)
+		# {lxml tag => (tag name, kind, is inline, omits end tag)},
+		# filled in as each tag is first seen.
+		self.tagInfos = {}
 
 	def serialize(self):
 		output = StringIO.StringIO()
-		writer = output.write
-		writer("<!doctype html>")
-		root = self.tree.getroot()
-		self._serializeEl(root, writer)
+		self.serializeTo(output.write)
 		str = output.getvalue()
 		output.close()
 		return str
 
+	def serializeTo(self, sink, chunkSize=64*1024):
+		# Streams the serialization to sink(), in chunks of roughly chunkSize characters,
+		# so the whole document never needs to be held in memory as a string.
+		writer = ChunkedWriter(sink, chunkSize)
+		writer.write("<!doctype html>")
+		root = self.tree.getroot()
+		self._serializeEl(root, writer.write)
+		writer.close()
+
+	def tagInfo(self, tag):
+		info = self.tagInfos.get(tag)
+		if info is None:
+			name = unfuckName(tag)
+			if name in self.voidEls:
+				kind = VOID
+			elif name in self.rawEls:
+				kind = RAW
+			elif name in self.opaqueEls:
+				kind = OPAQUE
+			else:
+				kind = NORMAL
+			isInline = (tag in self.inlineEls) or ("-" in tag and tag not in self.blockEls)
+			info = self.tagInfos[tag] = (name, kind, isInline, tag in self.omitEndTagEls)
+		return info
+
+	def groupIntoBlocks(self, nodes):
+		collect = []
+		for node in nodes:
+			if isElement(node) and not self.tagInfo(node.tag)[2]:
+				yield collect
+				collect = []
+				yield node
+			else:
+				collect.append(node)
+		yield collect
+
 	def _serializeEl(self, el, write, indent=0, pre=False, inline=False):
-		def unfuckName(n):
-			# LXML does namespaces stupidly
-			if n.startswith("{"):
-				return n.partition("}")[2]
-			return n
-		def groupIntoBlocks(nodes):
-			collect = []
-			for node in nodes:
-				if isElement(node) and not isInlineElement(node.tag):
-					yield collect
-					collect = []
-					yield node
-					continue
-				else:
-					collect.append(node)
-			yield collect
-		def fixWS(text):
-			import string
-			t1 = text.lstrip(string.whitespace)
-			if text != t1:
-				t1 = " " + t1
-			t2 = t1.rstrip(string.whitespace)
-			if t1 != t2:
-				t2 = t2 + " "
-			return t2
-		def startTag():
-			if isElement(el):
-				write("<")
-				write(unfuckName(el.tag))
-				for attrName, attrVal in sorted(el.items()):
-					write(" ")
-					write(unfuckName(attrName))
-					write('="')
-					write(escapeAttr(attrVal))
-					write('"')
-				write(">")
-		def endTag():
-			if isElement(el):
-				write("</")
-				write(unfuckName(el.tag))
-				write(">")
-		def isAnonBlock(block):
-			return not isElement(block)
-		def isVoidElement(tag):
-			return tag in self.voidEls
-		def isRawElement(tag):
-			return tag in self.rawEls
-		def isOpaqueElement(tag):
-			return tag in self.opaqueEls
-		def isInlineElement(tag):
-			return (tag in self.inlineEls) or ("-" in tag and tag not in self.blockEls)
-
-		if isElement(el):
-			tag = unfuckName(el.tag)
-		else:
-			# el is an array
-			tag = "[]"
+		if not isElement(el):
+			# el is an array of inline nodes
+			self._serializeInlines(el, write)
+			return
+
+		name, kind, _, omitEndTag = self.tagInfo(el.tag)
 
-		if isVoidElement(tag):
+		if kind == VOID:
 			write(" "*indent)
-			startTag()
+			startTag(el, name, write)
 			return
-		if isRawElement(tag):
-			startTag()
+		if kind == RAW:
+			startTag(el, name, write)
 			for node in childNodes(el):
 				if isElement(node):
 					die("Somehow a CDATA element got an element child:\n{0}", outerHTML(el))
 					return
 				else:
 					write(node)
-			endTag()
+			write("</" + name + ">")
 			return
-		if pre or isOpaqueElement(tag):
-			startTag()
+		if pre or kind == OPAQUE:
+			startTag(el, name, write)
 			for node in childNodes(el):
 				if isElement(node):
 					self._serializeEl(node, write, indent=indent, pre=True)
 				else:
 					write(escapeHTML(node))
-			endTag()
+			write("</" + name + ">")
 			return
-		if inline or isInlineElement(el):
-			startTag()
-			for node in childNodes(el):
-				if isElement(node):
-					self._serializeEl(node, write, inline=inline)
-				else:
-					write(escapeHTML(fixWS(node)))
-			endTag()
+		if inline:
+			startTag(el, name, write)
+			self._serializeInlines(childNodes(el), write)
+			write("</" + name + ">")
 			return
 
 		# Otherwise I'm a block element
-		def justWS(block):
-			if isElement(block):
-				return False
-			return len(block) == 1 and not isElement(block[0]) and block[0].strip() == ""
 		# Dropping pure-WS anonymous blocks.
 		# This maintains whitespace between *inline* elements, which is required.
 		# It just avoids serializing a line of "inline content" that's just WS.
-		blocks = [block for block in groupIntoBlocks(childNodes(el)) if not justWS(block)]
+		blocks = [block for block in self.groupIntoBlocks(childNodes(el)) if not justWS(block)]
 
 		# Handle all the possibilities
 		if len(blocks) == 0:
 			write(" "*indent)
-			startTag()
-			if el.tag not in self.omitEndTagEls:
-				endTag()
+			startTag(el, name, write)
+			if not omitEndTag:
+				write("</" + name + ">")
 			return
-		elif len(blocks) == 1 and isAnonBlock(blocks[0]):
+		elif len(blocks) == 1 and not isElement(blocks[0]):
 			# Contains only inlines, print accordingly
 			write(" "*indent)
-			startTag()
-			self._serializeEl(blocks[0], write, inline=True)
-			if el.tag not in self.omitEndTagEls:
-				endTag()
+			startTag(el, name, write)
+			self._serializeInlines(blocks[0], write)
+			if not omitEndTag:
+				write("</" + name + ">")
 			return
 		else:
 			# Otherwise I'm a block that contains at least one block
 			write(" "*indent)
-			startTag()
+			startTag(el, name, write)
 			for block in blocks:
 				if isElement(block):
 					write("\n")
@@ -155,9 +137,85 @@ class HTMLSerializer(object):
 					if len(block) > 0:
 						write("\n")
 						write(" "*(indent+1))
-						self._serializeEl(block, write, inline=True)
-			if el.tag not in self.omitEndTagEls:
+						self._serializeInlines(block, write)
+			if not omitEndTag:
 				write("\n")
 				write(" "*indent)
-				endTag()
+				write("</" + name + ">")
 		return
+
+	def _serializeInlines(self, nodes, write):
+		for node in nodes:
+			if isElement(node):
+				self._serializeEl(node, write, inline=True)
+			else:
+				write(escapeHTML(fixWS(node)))
+
+
+def unfuckName(n):
+	# LXML does namespaces stupidly
+	if n.startswith("{"):
+		return n.partition("}")[2]
+	return n
+
+def startTag(el, name, write):
+	write("<" + name)
+	if len(el.attrib):
+		for attrName, attrVal in sorted(el.items()):
+			write(" " + unfuckName(attrName) + '="' + escapeAttr(attrVal) + '"')
+	write(">")
+
+def fixWS(text):
+	t1 = text.lstrip(string.whitespace)
+	if text != t1:
+		t1 = " " + t1
+	t2 = t1.rstrip(string.whitespace)
+	if t1 != t2:
+		t2 = t2 + " "
+	return t2
+
+def justWS(block):
+	if isElement(block):
+		return False
+	return len(block) == 1 and not isElement(block[0]) and block[0].strip() == ""
+
+
+class ChunkedWriter(object):
+	'''
+	Collects lots of little writes into bigger chunks for a sink.
+	Every chunk but the last ends just after a newline,
+	so the sink can safely apply line-based filters to each chunk.
+	'''
+	def __init__(self, sink, chunkSize):
+		self.sink = sink
+		self.chunkSize = chunkSize
+		self.pieces = []
+		self.size = 0
+		self.flushAt = chunkSize
+
+	def write(self, text):
+		self.pieces.append(text)
+		self.size += len(text)
+		if self.size >= self.flushAt:
+			self.flush()
+
+	def flush(self):
+		text = "".join(self.pieces)
+		cut = text.rfind("\n") + 1
+		if cut == 0:
+			# No line break yet, so keep collecting.
+			self.pieces = [text]
+			self.flushAt = self.size + self.chunkSize
+			return
+		self.sink(text[:cut])
+		rest = text[cut:]
+		self.pieces = [rest]
+		self.size = len(rest)
+		self.flushAt = self.chunkSize
+
+	def close(self):
+		text = "".join(self.pieces)
+		if text:
+			self.sink(text)
+		self.pieces = []
+		self.size = 0
@@ -3,6 +3,7 @@ from __future__ import division, unicode_literals
 import re
 import json
 import io
+import os
 import collections
 import copy
 import collections
@@ -12,6 +13,8 @@ from . import config
 from . import biblio
 from . import enum
 from . import datablocks
+from . import dataindex
+from . import fuzzy
 from .SortedList import SortedList
 from .messages import *
 from .htmlhelpers import *
@@ -20,7 +23,7 @@ class ReferenceManager(object):
 
     def __init__(self, specStatus=None):
         # Dict of {linking text => [anchor data]}
-        self.refs = defaultdict(list)
+        self.refs = AnchorRefs()
         # Dict of {argless method signatures => {"argfull signature": {"args":[args], "for":[fors]}}}
         self.methods = defaultdict(dict)
         # Dict of {for value => [terms]}
@@ -36,25 +39,85 @@ class ReferenceManager(object):
         # Dict of {biblio term => biblio data}
         # Sparsely populated, with more loaded on demand
         self.biblios = defaultdict(list)
-        # All the biblio keys
-        self.biblioKeys = set()
+        # All the biblio keys; the global ones are only read from the index as they're asked about
+        self.biblioKeys = BiblioKeys()
         # Dict of {base key name => preferred display name}
         self.preferredBiblioNames = dict()
         # Dict of {spec vshortname => headings}
         # Each heading is either {#foo => heading-dict}, {/foo#bar => heading-dict} or {#foo => [page-heading-keys]}
         # In the latter, it's a list of the heading keys (of the form /foo#bar) that collide for that id.
+        # Sparsely populated, with each spec's headings loaded on demand by getHeadings()
         self.headings = dict()
         self.status = specStatus
-
-    def initializeRefs(self, doc=None):
-        # Load up the xref data
+        # Dict of {linking text => (wrapped refs, {dfn type => wrapped refs})}
+        # Built lazily from self.refs; an entry is dropped whenever refs are added for its text.
+        self._textIndex = dict()
+        # Dict of {query args => (refs, failure)}
+        # Emptied whenever anything that can change a query's answer is modified.
+        self._queryResults = dict()
+        # Dict of {normalized getRef() args => (ref, failure)}, emptied alongside _queryResults.
+        self._refResults = dict()
+        # The "did you mean" indexes over the linking texts, built on the first failed link,
+        # and dropped alongside _textIndex.
+        self._closeTextIndexes = None
+        self.refCacheHits = 0
+        self.refCacheMisses = 0
+        # Whether the spec-independent data has been loaded (or inherited via overlay()).
+        self.hasGlobalRefs = False
+        self.hasGlobalBiblio = False
+
+    def loadGlobalData(self):
+        # Loads everything that doesn't depend on the spec being built,
+        # without touching any local data files.
+        self.loadGlobalRefs()
+        self.loadGlobalBiblio()
+
+    def loadGlobalRefs(self):
+        if self.hasGlobalRefs:
+            return
         self.specs.update(json.loads(config.retrieveDataFile("specs.json", quiet=True, str=True)))
-        self.headings.update(json.loads(config.retrieveDataFile("headings.json", quiet=True, str=True)))
-        with config.retrieveDataFile("anchors.data", quiet=True) as lines:
-            self.refs = decodeAnchors(lines)
+        self.refs = loadAnchors()
+        self.clearQueryCaches()
         self.methods.update(json.loads(config.retrieveDataFile("methods.json", quiet=True, str=True)))
         self.fors.update(json.loads(config.retrieveDataFile("fors.json", quiet=True, str=True)))
+        self.hasGlobalRefs = True
+
+    def loadGlobalBiblio(self):
+        if self.hasGlobalBiblio:
+            return
+        self.biblioKeys.index = biblio.BiblioIndex()
+        self.hasGlobalBiblio = True
+
+    def overlay(self):
+        '''
+        Returns a fresh ReferenceManager for building a single spec,
+        layered over this one's global data so nothing has to be reloaded.
+
+        Data that builds only read (spec data, for values, headings) is shared outright.
+        Data that builds modify (anchors, method signatures, biblio entries)
+        is copied up from this manager only as the build touches it,
+        so this manager is never changed and can be reused for any number of builds.
+        '''
+        self.loadGlobalData()
+        rm = ReferenceManager()
+        rm.specs = self.specs
+        rm.fors = self.fors
+        rm.headings = self.headings
+        # With an index, anchors load straight from it, and the base is only used for its fuzzy index.
+        rm.refs = AnchorRefs(self.refs.index, base=self.refs)
+        rm.methods = LayeredDict(self.methods, dict)
+        rm.biblios = LayeredDict(self.biblios, list)
+        rm.biblioKeys = BiblioKeys(self.biblioKeys.index, self.biblioKeys.local)
+        rm.hasGlobalRefs = True
+        rm.hasGlobalBiblio = True
+        return rm
+
+    def initializeRefs(self, doc=None):
+        # Load up the xref data
+        self.loadGlobalRefs()
         if doc is not None:
+            doc.dependencies.add(os.path.abspath("anchors.bsdata"))
+            doc.dependencies.add(os.path.abspath("link-defaults.infotree"))
             # Get local anchor data
             try:
                 with io.open("anchors.bsdata", 'r', encoding="utf-8") as lines:
@@ -70,8 +133,10 @@ class ReferenceManager(object):
             except IOError:
                 pass
 
-    def initializeBiblio(self):
-        self.biblioKeys.update(json.loads(config.retrieveDataFile("biblio-keys.json", quiet=True, str=True)))
+    def initializeBiblio(self, doc=None):
+        self.loadGlobalBiblio()
+        if doc is not None:
+            doc.dependencies.add(os.path.abspath("biblio.json"))
 
         # Get local bibliography data
         try:
@@ -86,6 +151,17 @@ class ReferenceManager(object):
             self.biblios[k].extend(vs)
 
 
+    def getHeadings(self, spec):
+        # Returns the headings data for the given spec vshortname,
+        # or None if Bikeshed doesn't know the spec.
+        if spec in self.headings:
+            return self.headings[spec]
+        if spec not in self.specs:
+            return None
+        data = config.retrieveDataFile("headings/headings-{0}.json".format(spec), quiet=True, str=True)
+        self.headings[spec] = json.loads(data) if data is not None else None
+        return self.headings[spec]
+
     @property
     def status(self):
         return self._status
@@ -120,10 +196,39 @@ class ReferenceManager(object):
     def removeSameSpecRefs(self):
         # Kill all the non-local anchors with the same shortname as the current spec,
         # so you don't end up accidentally linking to something that's been removed from the local copy.
-        for term, refs in self.refs.items():
+        def unexportSameSpecRefs(refs):
             for ref in refs:
                 if ref['status'] != "local" and ref['shortname'].rstrip() == self.specName:
                     ref['export'] = False
+        for refs in self.refs.loadedValues():
+            unexportSameSpecRefs(refs)
+        # Anchors that are still sitting in the index get killed as they're loaded.
+        self.refs.onLoad = unexportSameSpecRefs
+        self.clearQueryCaches()
+
+    def clearQueryCaches(self):
+        self._textIndex.clear()
+        self._closeTextIndexes = None
+        self.clearQueryResults()
+
+    def clearQueryResults(self):
+        self._queryResults.clear()
+        self._refResults.clear()
+
+    def addRef(self, text, ref):
+        # All additions to the ref database should go through here,
+        # so the query caches stay in sync.
+        self.refs[text].append(ref)
+        self._textIndex.pop(text.rstrip("\n"), None)
+        self._closeTextIndexes = None
+        self.clearQueryResults()
+
+    def ignoreSpec(self, spec, replacedBy=None):
+        if replacedBy:
+            self.replacedSpecs.add((spec, replacedBy))
+        else:
+            self.ignoredSpecs.add(spec)
+        self.clearQueryResults()
 
     def addLocalDfns(self, dfns):
         for el in dfns:
@@ -177,7 +282,7 @@ class ReferenceManager(object):
                     "export":True,
                     "for": dfnFor
                 }
-                self.refs[linkText].append(ref)
+                self.addRef(linkText, ref)
                 methodishStart = re.match(r"([^(]+\()[^)]", linkText)
                 if methodishStart:
                     self.addMethodVariants(linkText, dfnFor, ref["shortname"])
@@ -203,11 +308,30 @@ class ReferenceManager(object):
                 die("Unknown spec status '{0}'. Status must be ED, TR, or local.", status)
             return None
 
+        # The same links show up over and over in a spec,
+        # so remember the result for each distinct (normalized) query.
+        # Messages are deduped anyway, so skipping them on a repeat is harmless,
+        # except for the ignored-specs error, which names the specific element.
+        key = (linkType, text, spec, status, linkFor, linkForHint, error)
+        if key in self._refResults:
+            self.refCacheHits += 1
+            ref, failure = self._refResults[key]
+        else:
+            self.refCacheMisses += 1
+            ref, failure = self._getRef(linkType, text, spec, status, linkFor, linkForHint, error, zeroRefsError)
+            self._refResults[key] = (ref, failure)
+        if failure == "ignored-specs" and zeroRefsError:
+            linkerror("The only '{0}' refs for '{1}' were in ignored specs:\n{2}", linkType, text, outerHTML(el))
+        return ref
+
+    def _getRef(self, linkType, text, spec, status, linkFor, linkForHint, error, zeroRefsError):
+        # Returns (ref, failure); failure is only reported for the errors getRef() has to emit itself.
+
         # Local refs always get precedence, unless you manually specified a spec.
         if spec is None:
-            localRefs = self.getLocalRef(linkType, text, linkFor, linkForHint, el)
+            localRefs = self.getLocalRef(linkType, text, linkFor, linkForHint)
             if len(localRefs) == 1:
-                return localRefs[0]
+                return localRefs[0], None
             elif len(localRefs) > 1:
                 if error:
                     linkerror("Multiple possible '{0}' local refs for '{1}'.\nArbitrarily chose the one with type '{2}' and for '{3}'.",
@@ -215,7 +339,7 @@ class ReferenceManager(object):
                          text,
                          localRefs[0].type,
                          "' or '".join(localRefs[0].for_))
-                return localRefs[0]
+                return localRefs[0], None
 
         # Take defaults into account
         if not spec or not status:
@@ -294,49 +418,51 @@ class ReferenceManager(object):
             if zeroRefsError and len(methodRefs) > 1:
                 # More than one possible foo() overload, can't tell which to link to
                 linkerror("Too many possible method targets to disambiguate '{0}/{1}'. Please specify the names of the required args, like 'foo(bar, baz)', in the 'for' attribute.", linkFor, text)
-                return
+                return None, None
             # Otherwise
 
         if failure == "text" or failure == "type":
             if linkType in ("property", "propdesc", "descriptor") and text.startswith("--"):
                 # Custom properties/descriptors aren't ever defined anywhere
-                return None
+                return None, None
             if zeroRefsError:
-                linkerror("No '{0}' refs found for '{1}'.", linkType, text)
-            return None
+                closeTexts = self.findCloseTexts(text) if failure == "text" else []
+                if closeTexts:
+                    linkerror("No '{0}' refs found for '{1}'. Did you mean:\n{2}", linkType, text, '\n'.join("  "+t for t in closeTexts))
+                else:
+                    linkerror("No '{0}' refs found for '{1}'.", linkType, text)
+            return None, None
         elif failure == "export":
             if zeroRefsError:
                 linkerror("No '{0}' refs found for '{1}' that are marked for export.", linkType, text)
-            return None
+            return None, None
         elif failure == "spec":
             if zeroRefsError:
                 linkerror("No '{0}' refs found for '{1}' with spec '{2}'.", linkType, text, spec)
-            return None
+            return None, None
         elif failure == "for":
             if zeroRefsError:
                 if spec is None:
                     linkerror("No '{0}' refs found for '{1}' with for='{2}'.", linkType, text, linkFor)
                 else:
                     linkerror("No '{0}' refs found for '{1}' with for='{2}' in spec '{3}'.", linkType, text, linkFor, spec)
-            return None
+            return None, None
         elif failure == "status":
             if zeroRefsError:
                 if spec is None:
                     linkerror("No '{0}' refs found for '{1}' compatible with status '{2}'.", linkType, text, status)
                 else:
                     linkerror("No '{0}' refs found for '{1}' compatible with status '{2}' in spec '{3}'.", linkType, text, status, spec)
-            return None
+            return None, None
         elif failure == "ignored-specs":
-            if zeroRefsError:
-                linkerror("The only '{0}' refs for '{1}' were in ignored specs:\n{2}", linkType, text, outerHTML(el))
-            return None
+            return None, failure
         elif failure:
             die("Programming error - I'm not catching '{0}'-type link failures. Please report!", failure)
-            return None
+            return None, None
 
         if len(refs) == 1:
             # Success!
-            return refs[0]
+            return refs[0], None
 
         # If we hit this point, there are >1 possible refs to choose from.
         # Default to linking to the first one.
@@ -367,7 +493,7 @@ class ReferenceManager(object):
                      text,
                      defaultRef.spec,
                      '\n'.join(possibleRefs))
-        return defaultRef
+        return defaultRef, None
 
     def getBiblioRef(self, text, status="normative", generateFakeRef=False, el=None, quiet=False):
         specStatus = "dated" if self.status == "TR" else "current"
@@ -379,9 +505,7 @@ class ReferenceManager(object):
             candidates = self.biblios[key]
         elif key in self.biblioKeys:
             # Key exists in biblio db, but its data isn't loaded yet.
-            group = key[0:2]
-            with config.retrieveDataFile("biblio/biblio-{0}.data".format(group), quiet=True) as lines:
-                biblio.loadBiblioDataFile(lines, self.biblios)
+            self.biblioKeys.index.load(key, self.biblios)
             candidates = self.biblios[key]
         elif key in self.specs:
             # First see if the ref is just unnecessarily levelled
@@ -422,58 +546,84 @@ class ReferenceManager(object):
         else:
             return results, error
 
+    def findCloseTexts(self, text, n=3):
+        # Linking texts that text might be a typo of.
+        # Nearly anything is a typo or two away from a very short text, so those get no suggestions.
+        if len(text) < 3:
+            return []
+        if self._closeTextIndexes is None:
+            self._closeTextIndexes = self.refs.fuzzyIndexes()
+        closeTexts = fuzzy.closest(self._closeTextIndexes, text, n, maxDistance=max(1, len(text)//4), skip=lambda t: t == text)
+        return [t for _,t in closeTexts]
+
+    def _textRefs(self, text):
+        # Returns the (wrapped refs, {dfn type => wrapped refs}) index entry for a linking text,
+        # building it the first time the text is asked about.
+        entry = self._textIndex.get(text)
+        if entry is None:
+            refs = [RefWrapper(text, ref) for ref in self.refs.get(text, [])]
+            refs.extend(RefWrapper(text, ref) for ref in self.refs.get(text+"\n", []))
+            byType = defaultdict(list)
+            for ref in refs:
+                byType[ref.type].append(ref)
+            entry = (refs, byType)
+            self._textIndex[text] = entry
+        return entry
+
     def _queryRefs(self, text=None, spec=None, linkType=None, linkFor=None, linkForHint=None, status=None, export=None, ignoreObsoletes=False, exact=False, error=False, **kwargs):
         # Query the ref database.
         # If it fails to find a ref, also returns the stage at which it finally ran out of possibilities.
-        def refsIterator(refs):
-            # Turns a dict of arrays of refs into an iterator of refs
-            for key, group in refs.items():
-                for ref in group:
-                    yield RefWrapper(key, ref)
-        def textRefsIterator(refs, texts):
-            # Same as above, but only grabs those keyed to a given text
-            for text in texts:
-                for ref in refs.get(text, []):
-                    yield RefWrapper(text, ref)
-                for ref in refs.get(text+"\n", []):
-                    yield RefWrapper(text, ref)
-        def forRefsIterator(refs, fors, targetFors):
-            # Same as above, but only grabs those for certain values
-            for for_ in targetFors:
-                for text in fors[for_]:
-                    for ref in refs.get(text, []):
-                        yield RefWrapper(text, ref)
-                    for ref in refs.get(text+"\n", []):
-                        yield RefWrapper(text, ref)
-
-        # Set up the initial list of refs to query
-        if text:
-            if exact:
-                refs = list(textRefsIterator(self.refs, [text]))
-            else:
-                textsToSearch = list(linkTextVariations(text, linkType))
-                if text.endswith("()") and text in self.methods:
-                    textsToSearch += self.methods[text].keys()
-                if (linkType is None or linkType in config.lowercaseTypes) and text.lower() != text:
-                    textsToSearch += [t.lower() for t in textsToSearch]
-                refs = list(textRefsIterator(self.refs, textsToSearch))
-        elif linkFor:
-            refs = list(forRefsIterator(self.refs, self.fors, [linkFor]))
-        else:
-            refs = list(refsIterator(self.refs))
-        if not refs:
-            return refs, "text"
-
+        # Autolinking asks the same questions over and over,
+        # so answers are remembered until the ref database changes.
+        key = (text, spec, linkType, linkFor, linkForHint, status, export, ignoreObsoletes, exact, error)
+        if key not in self._queryResults:
+            self._queryResults[key] = self._runQuery(text, spec, linkType, linkFor, linkForHint, status, export, ignoreObsoletes, exact, error)
+        refs, failure = self._queryResults[key]
+        return list(refs), failure
+
+    def _runQuery(self, text, spec, linkType, linkFor, linkForHint, status, export, ignoreObsoletes, exact, error):
         if linkType:
             if linkType in config.dfnTypes:
                 linkTypes = [linkType]
             elif linkType in config.linkTypeToDfnType:
                 linkTypes = list(config.linkTypeToDfnType[linkType])
             else:
-                if error:
-                    linkerror("Unknown link type '{0}'.",linkType)
-                return [], "type"
-            refs = [x for x in refs if x.type in linkTypes]
+                linkTypes = None
+
+        # Set up the initial list of refs to query
+        if text and exact and linkType and linkTypes is not None and len(linkTypes) == 1:
+            # Fast path: the index already has this text's refs split up by type.
+            refs, byType = self._textRefs(text)
+            if not refs:
+                return refs, "text"
+            refs = byType.get(linkTypes[0], [])
+        else:
+            if text:
+                if exact:
+                    textsToSearch = [text]
+                else:
+                    textsToSearch = list(linkTextVariations(text, linkType))
+                    if text.endswith("()") and text in self.methods:
+                        textsToSearch += self.methods[text].keys()
+                    if (linkType is None or linkType in config.lowercaseTypes) and text.lower() != text:
+                        textsToSearch += [t.lower() for t in textsToSearch]
+            elif linkFor:
+                textsToSearch = self.fors.get(linkFor, [])
+            else:
+                textsToSearch = None
+            if textsToSearch is None:
+                refs = [RefWrapper(key, ref) for key, group in self.refs.items() for ref in group]
+            else:
+                refs = [ref for t in textsToSearch for ref in self._textRefs(t)[0]]
+            if not refs:
+                return refs, "text"
+
+            if linkType:
+                if linkTypes is None:
+                    if error:
+                        linkerror("Unknown link type '{0}'.",linkType)
+                    return [], "type"
+                refs = [x for x in refs if x.type in linkTypes]
         if not refs:
             return refs, "type"
 
@@ -573,6 +723,8 @@ class ReferenceManager(object):
             args = [x.strip() for x in args.split(",")]
             variants[methodSig] = {"args":args, "for":[], "shortname": shortname}
         variants[methodSig]["for"].extend(forVals)
+        # Method variants widen the texts that inexact queries search.
+        self.clearQueryResults()
 
 
 def linkTextVariations(str, linkType):
@@ -702,6 +854,226 @@ def simplifyPossibleRefs(refs):
     return retRefs
 
 
+class AnchorRefs(dict):
+    '''
+    Dict of {linking text => [anchor data]}.
+
+    When backed by an anchor index, the anchors for a linking text
+    are only decoded the first time that text is asked for.
+    Otherwise, when layered over a base AnchorRefs,
+    a text's anchors are deep-copied out of the base the first time it's asked for,
+    so the base is never modified.
+    Either way, a base's "did you mean" index is shared rather than rebuilt.
+    If onLoad is set, it's called with each freshly-loaded list of anchors.
+    '''
+    def __init__(self, index=None, base=None):
+        dict.__init__(self)
+        self.index = index
+        self.base = base
+        self.onLoad = None
+        self._notInIndex = set()
+        self._fuzzyIndex = None
+
+    def _load(self, key):
+        if key in self._notInIndex:
+            return None
+        if self.index is not None:
+            data = self.index.get(key.encode("utf-8"))
+            refs = None if data is None else decodeAnchors(io.BytesIO(data)).get(key, [])
+        elif self.base is not None:
+            refs = self.base.get(key)
+            refs = None if refs is None else copy.deepcopy(refs)
+        else:
+            return None
+        if refs is None:
+            self._notInIndex.add(key)
+            return None
+        if self.onLoad:
+            self.onLoad(refs)
+        dict.__setitem__(self, key, refs)
+        return refs
+
+    def __missing__(self, key):
+        refs = self._load(key)
+        if refs is None:
+            refs = []
+            dict.__setitem__(self, key, refs)
+        return refs
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._load(key) is not None
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        refs = self._load(key)
+        if refs is None:
+            return default
+        return refs
+
+    def loadedValues(self):
+        return dict.values(self)
+
+    def fuzzyIndexes(self):
+        # For "did you mean" searches over the linking texts.
+        # The global texts (which end in a newline) are indexed once, by the base if there is one,
+        # so every build layered over it shares the index;
+        # any others (the local ones) get indexed each time.
+        if self.base is not None:
+            indexes = self.base.fuzzyIndexes()
+        else:
+            if self._fuzzyIndex is None:
+                if self.index is not None:
+                    keys = [key.decode("utf-8").strip() for key in self.index.keys()]
+                else:
+                    keys = [key.strip() for key in dict.keys(self) if key.endswith("\n")]
+                self._fuzzyIndex = fuzzy.NgramIndex(keys)
+            indexes = [self._fuzzyIndex]
+        localTexts = [key for key, refs in dict.iteritems(self) if refs and not key.endswith("\n")]
+        if localTexts:
+            indexes.append(fuzzy.NgramIndex(localTexts))
+        return indexes
+
+    def loadAll(self):
+        if self.index is not None:
+            keys = (key.decode("utf-8") for key in self.index.keys())
+        elif self.base is not None:
+            keys = self.base.keys()
+        else:
+            return
+        for key in keys:
+            if not dict.__contains__(self, key):
+                self._load(key)
+        self.index = None
+        self.base = None
+
+    def keys(self):
+        self.loadAll()
+        return dict.keys(self)
+
+    def values(self):
+        self.loadAll()
+        return dict.values(self)
+
+    def items(self):
+        self.loadAll()
+        return dict.items(self)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        self.loadAll()
+        return dict.__len__(self)
+
+
+class BiblioKeys(object):
+    '''
+    Set of biblio keys, layering keys added locally
+    (from biblio.json or biblio blocks) over the global biblio index,
+    so the global keys never have to be loaded into a set.
+    '''
+    def __init__(self, index=None, local=()):
+        self.index = index
+        self.local = set(local)
+
+    def add(self, key):
+        self.local.add(key)
+
+    def __contains__(self, key):
+        return key in self.local or (self.index is not None and key in self.index)
+
+    def __iter__(self):
+        for key in self.local:
+            yield key
+        if self.index is not None:
+            for key in self.index:
+                if key not in self.local:
+                    yield key
+
+    def fuzzyIndexes(self):
+        # For "did you mean" searches; the global index is built once and shared.
+        indexes = [fuzzy.NgramIndex(self.local)]
+        if self.index is not None:
+            indexes.append(self.index.fuzzyIndex())
+        return indexes
+
+
+class LayeredDict(dict):
+    '''
+    Dict that falls back to a base dict for missing keys,
+    deep-copying a base value up into itself the first time it's asked for,
+    so it can be freely mutated without affecting the base.
+    Keys missing from both get a fresh default(), like a defaultdict.
+    '''
+    def __init__(self, base, default):
+        dict.__init__(self)
+        self.base = base
+        self.default = default
+
+    def __missing__(self, key):
+        if key in self.base:
+            val = copy.deepcopy(self.base[key])
+        else:
+            val = self.default()
+        dict.__setitem__(self, key, val)
+        return val
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.base
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+
+def loadAnchors():
+    # Prefer reading anchors through the index, so only the anchors actually used get decoded.
+    # If there's no usable index (and one can't be built), fall back to decoding everything.
+    index = openAnchorIndex()
+    if index is not None:
+        return AnchorRefs(index)
+    refs = AnchorRefs()
+    with config.retrieveDataFile("anchors.data", quiet=True) as lines:
+        refs.update(decodeAnchors(lines))
+    return refs
+
+def openAnchorIndex():
+    with config.retrieveDataFile("anchors.data", quiet=True) as fh:
+        sourcePath = fh.name
+    indexPath = config.scriptPath + "/spec-data/anchors.index"
+    index = dataindex.openIndex(indexPath, sourcePath)
+    if index is None and not config.dryRun:
+        # Missing or stale, so (re)build it from the anchor data.
+        try:
+            writeAnchorIndex(sourcePath, indexPath)
+        except (IOError, OSError):
+            return None
+        index = dataindex.openIndex(indexPath, sourcePath)
+    return index
+
+def writeAnchorIndex(sourcePath, indexPath):
+    # Groups the raw anchor lines by key, without decoding them.
+    # Keys may be duplicated in anchors.data, so this collects them all up.
+    entries = defaultdict(list)
+    with io.open(sourcePath, 'rb') as linesIter:
+        try:
+            while True:
+                key = linesIter.next()
+                segment = [key]
+                for _ in range(8):
+                    segment.append(linesIter.next())
+                while True:
+                    line = linesIter.next()
+                    segment.append(line)
+                    if line == b"-\n":
+                        break
+                entries[key].extend(segment)
+        except StopIteration:
+            pass
+    dataindex.writeIndex(indexPath, {k:b"".join(v) for k,v in entries.items()}, sourcePath)
+
 def decodeAnchors(linesIter):
     # Decodes the anchor storage format into a list of dicts
     anchors = defaultdict(list)
@@ -11,6 +11,7 @@ import json
 import urllib
 import urllib2
 import argparse
+import pipes
 import itertools
 import importlib
 from datetime import date, datetime
@@ -26,10 +27,15 @@ from . import headings
 from . import shorthands
 from . import boilerplate
 from . import datablocks
-from . import lexers
+from . import highlight
 from . import publish
+from . import serve
+from . import batch
 from . import extensions
 from .ReferenceManager import ReferenceManager
+from .buildcache import BuildCache
+from .fetcher import Fetcher
+from .timings import Timings
 from .htmlhelpers import *
 from .messages import *
 from .widlparser.widlparser import parser
@@ -67,6 +73,10 @@ def main():
     specParser.add_argument("--debug", dest="debug", action="store_true", help="Switches on some debugging tools. Don't use for production!")
     specParser.add_argument("--gh-token", dest="ghToken", nargs="?",
                            help="GitHub access token. Useful to avoid API rate limits. Generate tokens: https://github.com/settings/tokens.")
+    specParser.add_argument("--timings", dest="timings", action="store_true",
+                            help="Print how long each stage of processing took, and the peak memory use after it.")
+    specParser.add_argument("--timings-json", dest="timingsJson", metavar="FILE", default=None,
+                            help="Save the per-stage timings as JSON to FILE ('-' for stdout).")
     specParser.add_argument("--byos", dest="byos", action="store_true",
                             help="Bring-Your-Own-Spec: turns off all the Bikeshed auto-niceties, so you can piecemeal its features into your existing doc instead. Experimental, let me know if things get crashy or weird.")
 
@@ -93,6 +103,22 @@ def main():
     watchParser.add_argument("--byos", dest="byos", action="store_true",
                             help="Bring-Your-Own-Spec: turns off all the Bikeshed auto-niceties, so you can piecemeal its features into your existing doc instead. Experimental, let me know if things get crashy or weird.")
 
+    batchParser = subparsers.add_parser('batch', help="Process many spec source files at once, in parallel. Each output file is saved next to its source.")
+    batchParser.add_argument("patterns", nargs="+",
+                            metavar="GLOB",
+                            help="Paths or glob patterns for the source files.")
+    batchParser.add_argument("-j", "--jobs", dest="jobs", type=int, default=None,
+                            help="Number of worker processes. [default: number of CPUs]")
+
+    serveParser = subparsers.add_parser('serve', help="Run a local server that builds specs on request, keeping the reference data loaded between builds.")
+    serveParser.add_argument("root", nargs="?",
+                            default=".",
+                            help="Directory to serve spec source files from. [default: current directory]")
+    serveParser.add_argument("--port", dest="port", type=int, default=8000,
+                            help="Port to listen on. [default: %(default)s]")
+    serveParser.add_argument("--host", dest="host", default="localhost",
+                            help="Host to listen on. [default: %(default)s]")
+
     updateParser = subparsers.add_parser('update', help="Update supporting files (those in /spec-data).", epilog="If no options are specified, everything is downloaded.")
     updateParser.add_argument("--anchors", action="store_true", help="Download crossref anchor data.")
     updateParser.add_argument("--biblio", action="store_true", help="Download biblio data.")
@@ -155,6 +181,10 @@ def main():
                             metavar="FILE",
                             nargs="*",
                             help="Rebase the specified files. If called with no args, rebases everything.")
+    testParser.add_argument("--bench-serializer",
+                            dest="benchSerializer",
+                            action="store_true",
+                            help="Time the serializer on the tests with the largest outputs.")
 
     profileParser = subparsers.add_parser('profile', help="Profiling Bikeshed. Needs graphviz, gprof2dot, and xdot installed.")
     profileParser.add_argument("--root",
@@ -188,8 +218,16 @@ def main():
         doc.md = metadata.fromCommandLine(extras, doc)
         if options.byos:
             doc.md.addData("Group", "byos")
+        doc.timings.enabled = options.timings or options.timingsJson is not None
         doc.preprocess()
         doc.finish(outputFilename=options.outfile)
+        if options.timings:
+            p(doc.timings.table())
+        if options.timingsJson == "-":
+            p(doc.timings.json())
+        elif options.timingsJson is not None:
+            with io.open(options.timingsJson, "w", encoding="utf-8") as f:
+                f.write(doc.timings.json())
     elif options.subparserName == "echidna":
         doc = Spec(inputFilename=options.infile, token=options.ghToken)
         doc.md = metadata.fromCommandLine(extras, doc)
@@ -206,6 +244,15 @@ def main():
         if options.byos:
             doc.md.addData("Group", "byos")
         doc.watch(outputFilename=options.outfile)
+    elif options.subparserName == "batch":
+        # One broken spec shouldn't stop the rest of the batch
+        config.force = True
+        result = batch.batch(constructor=Spec, patterns=options.patterns, jobs=options.jobs)
+        sys.exit(0 if result else 1)
+    elif options.subparserName == "serve":
+        # Can't have an error killing the server
+        config.force = True
+        serve.serve(constructor=Spec, port=options.port, host=options.host, root=options.root)
     elif options.subparserName == "debug":
         config.force = True
         config.quiet = 2
@@ -260,6 +307,10 @@ def main():
     elif options.subparserName == "test":
         if options.rebaseFiles is not None:
             test.rebase(options.rebaseFiles)
+        elif options.benchSerializer:
+            config.force = True
+            config.quiet = 4
+            test.benchSerializer(constructor=Spec)
         else:
             config.force = True
             config.quiet = 2
@@ -268,10 +319,11 @@ def main():
     elif options.subparserName == "profile":
         root = "--root=\"{0}\"".format(options.root) if options.root else ""
         leaf = "--leaf=\"{0}\"".format(options.leaf) if options.leaf else ""
+        script = pipes.quote(os.path.abspath(os.path.join(config.scriptPath, "..", "bikeshed.py")))
         if options.svgFile:
-            os.system("python -m cProfile -o stat.prof ~/bikeshed/bikeshed.py && gprof2dot -f pstats --skew=.0001 {root} {leaf} stat.prof | dot -Tsvg -o {svg} && rm stat.prof".format(root=root, leaf=leaf, svg=options.svgFile))
+            os.system("python -m cProfile -o stat.prof {script} && gprof2dot -f pstats --skew=.0001 {root} {leaf} stat.prof | dot -Tsvg -o {svg} && rm stat.prof".format(script=script, root=root, leaf=leaf, svg=options.svgFile))
         else:
-            os.system("python -m cProfile -o /tmp/stat.prof ~/bikeshed/bikeshed.py && gprof2dot -f pstats --skew=.0001 {root} {leaf} /tmp/stat.prof | xdot &".format(root=root, leaf=leaf))
+            os.system("python -m cProfile -o /tmp/stat.prof {script} && gprof2dot -f pstats --skew=.0001 {root} {leaf} /tmp/stat.prof | xdot &".format(script=script, root=root, leaf=leaf))
     elif options.subparserName == "template":
         p('''<pre class='metadata'>
 Title: Your Spec Title
@@ -292,7 +344,7 @@ Introduction here.
 
 class Spec(object):
 
-    def __init__(self, inputFilename, paragraphMode="markdown", debug=False, token=None):
+    def __init__(self, inputFilename, paragraphMode="markdown", debug=False, token=None, baseRefs=None, fetcher=None):
         self.valid = False
         if inputFilename is None:
             # Default to looking for a *.bs file.
@@ -309,13 +361,27 @@ class Spec(object):
         self.inputSource = inputFilename
         self.debug = debug
         self.token = token
+        # A ReferenceManager with the global data already loaded, to build on top of.
+        self.baseRefs = baseRefs
+        # Outputs of self-contained transforms, kept across rebuilds.
+        self.cache = BuildCache()
+        # For anything fetched over the network while building.
+        self.fetcher = fetcher or Fetcher()
+        self.timings = Timings()
 
         self.valid = self.initializeState()
 
     def initializeState(self):
+        # Every local file the build reads (or looks for), so watch mode knows what to watch.
+        self.dependencies = set()
+        if self.inputSource != "-":
+            self.dependencies.add(os.path.abspath(self.inputSource))
         self.normativeRefs = {}
         self.informativeRefs = {}
-        self.refs = ReferenceManager()
+        if self.baseRefs is None:
+            self.refs = ReferenceManager()
+        else:
+            self.refs = self.baseRefs.overlay()
         self.externalRefsUsed = defaultdict(dict)
         self.md = metadata.MetadataManager(doc=self)
         self.biblios = {}
@@ -486,105 +552,119 @@ class Spec(object):
         return True
 
     def preprocess(self):
+        # Every stage goes through run(), so --timings can measure it.
+        self.timings.reset()
+        run = self.timings.run
+
         # Textual hacks
-        stripBOM(self)
-        self.lines = markdown.stripComments(self.lines)
+        run(stripBOM, self)
+        self.lines = run(markdown.stripComments, self.lines)
 
         # Extract and process metadata
-        self.lines, documentMd = metadata.parse(lines=self.lines, doc=self)
+        self.lines, documentMd = run(metadata.parse, lines=self.lines, doc=self)
         self.md = metadata.join(documentMd, self.md)
-        defaultMd = metadata.fromJson(data=config.retrieveBoilerplateFile(self, 'defaults', error=True), doc=self)
+        defaultMd = run(metadata.fromJson, data=config.retrieveBoilerplateFile(self, 'defaults', error=True), doc=self)
         self.md = metadata.join(defaultMd, self.md)
         if self.md.group == "byos":
             self.md.boilerplate.default = False
-        self.md.finish()
-        extensions.load(self)
-        self.md.fillTextMacros(self.macros, doc=self)
+        run(self.md.finish)
+        run(extensions.load, self)
+        run(self.md.fillTextMacros, self.macros, doc=self)
 
         # Initialize things
-        self.refs.initializeRefs(self);
-        self.refs.initializeBiblio();
+        run(self.refs.initializeRefs, self)
+        run(self.refs.initializeBiblio, self)
 
         # Deal with further <pre> blocks, and markdown
-        self.lines = datablocks.transformDataBlocks(self, self.lines)
-        self.lines = markdown.parse(self.lines, self.md.indent, opaqueElements=self.md.opaqueElements, blockElements=self.md.blockElements)
+        self.lines = run(datablocks.transformDataBlocks, self, self.lines)
+        self.lines = run(markdown.parse, self.lines, self.md.indent, opaqueElements=self.md.opaqueElements, blockElements=self.md.blockElements)
 
-        self.refs.setSpecData(self.md)
+        run(self.refs.setSpecData, self.md)
 
         # Convert to a single string of html now, for convenience.
         self.html = ''.join(self.lines)
-        boilerplate.addHeaderFooter(self)
-        self.html = self.fixText(self.html)
+        run(boilerplate.addHeaderFooter, self)
+        self.html = run(self.fixText, self.html)
 
         # Build the document
-        self.document = parseDocument(self.html)
-        processInclusions(self)
-        metadata.parseDoc(self)
+        self.document = run(parseDocument, self.html)
+        run(processInclusions, self)
+        run(metadata.parseDoc, self)
 
         # Fill in and clean up a bunch of data
-        boilerplate.addBikeshedVersion(self)
-        boilerplate.addStatusSection(self)
-        boilerplate.addLogo(self)
-        boilerplate.addCopyright(self)
-        boilerplate.addSpecMetadataSection(self)
-        boilerplate.addAbstract(self)
-        boilerplate.addObsoletionNotice(self)
-        boilerplate.addAtRisk(self)
-        addNoteHeaders(self)
-        boilerplate.removeUnwantedBoilerplate(self)
-        shorthands.transformProductionPlaceholders(self)
-        shorthands.transformMaybePlaceholders(self)
-        shorthands.transformAutolinkShortcuts(self)
-        shorthands.transformProductionGrammars(self)
-        canonicalizeShortcuts(self)
-        fixManualDefTables(self)
-        headings.processHeadings(self)
-        checkVarHygiene(self)
-        processIssuesAndExamples(self)
-        markupIDL(self)
-        inlineRemoteIssues(self)
+        run(boilerplate.addBikeshedVersion, self)
+        run(boilerplate.addStatusSection, self)
+        run(boilerplate.addLogo, self)
+        run(boilerplate.addCopyright, self)
+        run(boilerplate.addSpecMetadataSection, self)
+        run(boilerplate.addAbstract, self)
+        run(boilerplate.addObsoletionNotice, self)
+        run(boilerplate.addAtRisk, self)
+        run(addNoteHeaders, self)
+        run(boilerplate.removeUnwantedBoilerplate, self)
+        run(shorthands.transformProductionPlaceholders, self)
+        run(shorthands.transformMaybePlaceholders, self)
+        run(shorthands.transformAutolinkShortcuts, self)
+        run(shorthands.transformProductionGrammars, self)
+        run(canonicalizeShortcuts, self)
+        run(fixManualDefTables, self)
+        run(headings.processHeadings, self)
+        run(checkVarHygiene, self)
+        run(processIssuesAndExamples, self)
+        run(markupIDL, self)
+        run(inlineRemoteIssues, self)
 
 
         # Handle all the links
-        processBiblioLinks(self)
-        processDfns(self)
-        processIDL(self)
-        fillAttributeInfoSpans(self)
-        formatArgumentdefTables(self)
-        formatElementdefTables(self)
-        processAutolinks(self)
-        boilerplate.addIndexSection(self)
-        boilerplate.addExplicitIndexes(self)
-        boilerplate.addStyles(self)
-        boilerplate.addReferencesSection(self)
-        boilerplate.addPropertyIndex(self)
-        boilerplate.addIDLSection(self)
-        boilerplate.addIssuesSection(self)
-        boilerplate.addCustomBoilerplate(self)
-        headings.processHeadings(self, "all") # again
-        boilerplate.removeUnwantedBoilerplate(self)
-        boilerplate.addTOCSection(self)
-        addSelfLinks(self)
-        processAutolinks(self)
-        boilerplate.addAnnotations(self)
-        boilerplate.removeUnwantedBoilerplate(self)
-        addSyntaxHighlighting(self)
-        boilerplate.addBikeshedBoilerplate(self)
-        fixIntraDocumentReferences(self)
-        fixInterDocumentReferences(self)
+        run(processBiblioLinks, self)
+        run(processDfns, self)
+        run(processIDL, self)
+        run(fillAttributeInfoSpans, self)
+        run(formatArgumentdefTables, self)
+        run(formatElementdefTables, self)
+        run(processAutolinks, self)
+        run(boilerplate.addIndexSection, self)
+        run(boilerplate.addExplicitIndexes, self)
+        run(boilerplate.addStyles, self)
+        run(boilerplate.addReferencesSection, self)
+        run(boilerplate.addPropertyIndex, self)
+        run(boilerplate.addIDLSection, self)
+        run(boilerplate.addIssuesSection, self)
+        run(boilerplate.addCustomBoilerplate, self)
+        run(headings.processHeadings, self, "all") # again
+        run(boilerplate.removeUnwantedBoilerplate, self)
+        run(boilerplate.addTOCSection, self)
+        run(addSelfLinks, self)
+        run(processAutolinks, self)
+        run(boilerplate.addAnnotations, self)
+        run(boilerplate.removeUnwantedBoilerplate, self)
+        run(highlight.addSyntaxHighlighting, self)
+        run(boilerplate.addBikeshedBoilerplate, self)
+        run(fixIntraDocumentReferences, self)
+        run(fixInterDocumentReferences, self)
 
         # Any final HTML cleanups
-        cleanupHTML(self)
+        run(cleanupHTML, self)
         if self.md.prepTR:
-            extensions.BSPrepTR(self)
+            run(extensions.BSPrepTR, self)
+
+        if self.debug:
+            say("Ref resolution cache: {0} hits, {1} misses.", self.refs.refCacheHits, self.refs.refCacheMisses)
+            say("Build cache: {0} hits, {1} misses.", self.cache.hits, self.cache.misses)
+        self.cache.finishBuild()
 
         return self
 
 
     def serialize(self):
-        rendered = HTMLSerializer.HTMLSerializer(self.document, self.md.opaqueElements, self.md.blockElements).serialize()
-        rendered = finalHackyCleanup(rendered)
-        return rendered
+        chunks = []
+        self.serializeTo(chunks.append)
+        return "".join(chunks)
+
+    def serializeTo(self, write):
+        # Streams the rendered document to write(), a chunk at a time.
+        serializer = HTMLSerializer.HTMLSerializer(self.document, self.md.opaqueElements, self.md.blockElements)
+        self.timings.run(serializer.serializeTo, lambda chunk: write(finalHackyCleanup(chunk)))
 
     def fixMissingOutputFilename(self, outputFilename):
         if outputFilename is None:
@@ -602,16 +682,39 @@ class Spec(object):
     def finish(self, outputFilename):
         self.printResultMessage()
         outputFilename = self.fixMissingOutputFilename(outputFilename)
-        rendered = self.serialize()
-        if not config.dryRun:
+        if config.dryRun:
+            self.serializeTo(lambda chunk: None)
+            return
+        if outputFilename == "-":
             try:
-                if outputFilename == "-":
-                    outputFile = sys.stdout.write(rendered)
-                else:
-                    with io.open(outputFilename, "w", encoding="utf-8") as f:
-                        f.write(rendered)
-            except Exception, e:
+                self.serializeTo(sys.stdout.write)
+            except IOError, e:
                 die("Something prevented me from saving the output document to {0}:\n{1}", outputFilename, e)
+            except Exception, e:
+                die("Something went wrong while serializing the output document:\n{0}", e)
+            return
+        # Serialize into a temp file next to the output, then rename it into place,
+        # so a failure partway through never leaves a truncated document behind,
+        # and anything watching the output never sees a half-written one.
+        tempFilename = "{0}.{1}.tmp".format(outputFilename, os.getpid())
+        try:
+            with io.open(tempFilename, "w", encoding="utf-8") as f:
+                self.serializeTo(f.write)
+            try:
+                os.rename(tempFilename, outputFilename)
+            except OSError:
+                # Windows won't rename over an existing file.
+                os.remove(outputFilename)
+                os.rename(tempFilename, outputFilename)
+        except (IOError, OSError), e:
+            die("Something prevented me from saving the output document to {0}:\n{1}", outputFilename, e)
+        except Exception, e:
+            die("Something went wrong while serializing the output document:\n{0}", e)
+        finally:
+            try:
+                os.remove(tempFilename)
+            except OSError:
+                pass
 
     def printResultMessage(self):
         # If I reach this point, I've succeeded, but maybe with reservations.
@@ -629,28 +732,30 @@ class Spec(object):
             return
 
     def watch(self, outputFilename):
-        import time
+        from . import watcher
         outputFilename = self.fixMissingOutputFilename(outputFilename)
         if self.inputSource == "-" or outputFilename == "-":
             die("Watch mode doesn't support streaming from STDIN or to STDOUT.")
             return
         try:
-            lastInputModified = os.stat(self.inputSource).st_mtime
+            fileWatcher = watcher.Watcher()
+            # Snapshotted before building, so a save made during the build still triggers a rebuild.
+            fileWatcher.snapshot(self.dependencies)
             self.preprocess()
             self.finish(outputFilename)
             p("==============DONE==============")
             while(True):
-                inputModified = os.stat(self.inputSource).st_mtime
-                if inputModified > lastInputModified:
-                    resetSeenMessages()
-                    lastInputModified = inputModified
-                    formattedTime = datetime.fromtimestamp(inputModified).strftime("%H:%M:%S")
-                    p("Source file modified at {0}. Rebuilding...".format(formattedTime))
-                    self.initializeState()
-                    self.preprocess()
-                    self.finish(outputFilename)
-                    p("==============DONE==============")
-                time.sleep(1)
+                # Wait on everything the last build read, not just the source file.
+                changed = fileWatcher.wait(self.dependencies)
+                resetSeenMessages()
+                formattedTime = datetime.now().strftime("%H:%M:%S")
+                p("{0} modified at {1}. Rebuilding...".format(", ".join(sorted(os.path.relpath(path) for path in changed)), formattedTime))
+                lastDependencies = self.dependencies
+                self.initializeState()
+                fileWatcher.snapshot(lastDependencies | self.dependencies)
+                self.preprocess()
+                self.finish(outputFilename)
+                p("==============DONE==============")
         except Exception, e:
             die("Something went wrong while watching the file:\n{0}", e)
 
@@ -855,11 +960,10 @@ def checkVarHygiene(doc):
 
 
 def fixIntraDocumentReferences(doc):
-    ids = {el.get('id'):el for el in findAll("[id]", doc)}
-    headingIDs = {el.get('id'):el for el in findAll("[id].heading", doc)}
+    ids = IDRegistry(doc)
     for el in findAll("a[href^='#']:not([href='#']):not(.self-link):not([data-link-type])", doc):
         targetID = el.get("href")[1:]
-        if el.get('data-section') is not None and targetID not in headingIDs:
+        if el.get('data-section') is not None and not any(hasClass(target, "heading") for target in ids.all(targetID)):
             die("Couldn't find target document section {0}:\n{1}", targetID, outerHTML(el))
             continue
         elif targetID not in ids:
@@ -867,7 +971,7 @@ def fixIntraDocumentReferences(doc):
             continue
         if isEmpty(el):
             # TODO Allow this to respect "safe" markup (<sup>, etc) in the title
-            target = ids[targetID]
+            target = ids.get(targetID)
             content = find(".content", target)
             if content is None:
                 die("Tried to generate text for a section link, but the target isn't a heading:\n{0}", outerHTML(el))
@@ -887,9 +991,9 @@ def fixInterDocumentReferences(doc):
         if section is None:
             die("Spec-section autolink doesn't have a 'spec-section' attribute:\n{0}", outerHTML(el))
             continue
-        if spec in doc.refs.headings:
+        specData = doc.refs.getHeadings(spec)
+        if specData is not None:
             # Bikeshed recognizes the spec
-            specData = doc.refs.headings[spec]
             if section in specData:
                 heading = specData[section]
             else:
@@ -1389,11 +1493,12 @@ def addSelfLinks(doc):
         return E.a({"href": "#" + urllib.quote(el.get('id', '')), "class":"self-link"})
 
     dfnElements = findAll(config.dfnElementsSelector, doc)
+    dfnElementSet = set(dfnElements)
 
     foundFirstNumberedSection = False
     for el in findAll("h2, h3, h4, h5, h6", doc):
         foundFirstNumberedSection = foundFirstNumberedSection or (el.get('data-level') is not None)
-        if el in dfnElements:
+        if el in dfnElementSet:
             # It'll get a self-link or dfn-panel later.
             continue
         if foundFirstNumberedSection:
@@ -1736,13 +1841,17 @@ def markupIDL(doc):
         if not isNormative(el):
             continue
         text = textContent(el)
-        # Parse once with a fresh parser, so I can spit out just this <pre>'s markup.
-        # Parse a second time with the global one, which collects all data in the doc.
-        widl = parser.Parser(text, IDLUI())
-        doc.widl.parse(text)
-        marker = DebugMarker() if doc.debug else IDLMarker()
-        text = unicode(widl.markup(marker))
-        replaceContents(el, parseHTML(text))
+        # Parse with a fresh parser, so I can spit out just this <pre>'s markup,
+        # then hand the same parsed constructs to the global one,
+        # which collects all data in the doc.
+        # (The parse is reused outright if the same IDL was seen in a previous build.)
+        def parseAndMarkup():
+            widl = parser.Parser(text, IDLUI())
+            marker = DebugMarker() if doc.debug else IDLMarker()
+            return widl.constructs, unicode(widl.markup(marker))
+        constructs, markedUp = doc.cache.cached("idl", [text, "debug" if doc.debug else ""], parseAndMarkup)
+        doc.widl.constructs.extend(constructs)
+        replaceContents(el, parseHTML(markedUp))
 
 
 
@@ -1808,90 +1917,6 @@ def processIDL(doc):
 
 
 
-def addSyntaxHighlighting(doc):
-    try:
-        import pygments as pyg
-        from pygments.lexers import get_lexer_by_name
-        from pygments import formatters
-        from pygments import token
-        from pygments import style
-    except ImportError:
-        die("Bikeshed now uses Pygments for syntax highlighting.\nPlease run `$ sudo pip install pygments` from your command line.")
-        return
-
-    class PrismStyle(style.Style):
-        default_style = "#000000"
-        styles = {
-            token.Name: "#0077aa",
-            token.Name.Tag: "#669900",
-            token.Name.Builtin: "noinherit",
-            token.Name.Other: "noinherit",
-            token.Operator: "#999999",
-            token.Punctuation: "#999999",
-            token.Keyword: "#990055",
-            token.Literal: "#000000",
-            token.Literal.Number: "#000000",
-            token.Literal.String: "#a67f59",
-            token.Comment: "#708090"
-        }
-
-    customLexers = {
-        "css": lexers.CSSLexer()
-    }
-
-    def highlight(el, lang):
-        text = textContent(el)
-        if lang in customLexers:
-            lexer = customLexers[lang]
-        else:
-            try:
-                lexer = get_lexer_by_name(lang, encoding="utf-8", stripAll=True)
-            except pyg.util.ClassNotFound:
-                die("'{0}' isn't a known syntax-highlighting language. See http://pygments.org/docs/lexers/. Seen on:\n{1}", lang, outerHTML(el))
-                return
-        highlighted = parseHTML(pyg.highlight(text, lexer, formatters.HtmlFormatter()))[0][0]
-        # Remove the trailing newline
-        if len(highlighted):
-            highlighted[-1].tail = highlighted[-1].tail.rstrip()
-        replaceContents(el, highlighted)
-        addClass(el, "highlight")
-
-    highlightingOccurred = False
-
-    def translateLang(lang):
-        # Translates some names to ones Pygment understands
-        if lang == "aspnet":
-            return "aspx-cs"
-        if lang in ["markup", "svg"]:
-            return "html"
-        return lang
-
-    # Translate Prism-style highlighting into Pygment-style
-    for el in findAll("[class*=language-], [class*=lang-]", doc):
-        match = re.search("(?:lang|language)-(\w+)", el.get("class"))
-        if match:
-            el.set("highlight", match.group(1))
-
-    # Highlight all the appropriate elements
-    for el in findAll("xmp, pre, code", doc):
-        if list(childElements(el)):
-            # If there's any internal structure, don't override it with highlighting.
-            continue
-        attr, lang = closestAttr(el, "nohighlight", "highlight")
-        if attr == "nohighlight" or attr is None:
-            continue
-        highlight(el, translateLang(lang))
-        highlightingOccurred = True
-
-    if highlightingOccurred:
-        doc.extraStyles['style-syntax-highlighting'] += formatters.HtmlFormatter(style=PrismStyle).get_style_defs('.highlight')
-        doc.extraStyles['style-syntax-highlighting'] += """
-        .highlight { background: hsl(24, 20%, 95%); }
-        code.highlight { padding: .1em; border-radius: .3em; }
-        xmp.highlight, pre.highlight, pre > code.highlight { display: block; padding: 1em; margin: .5em 0; overflow: auto; border-radius: 0; }
-        """
-
-
 def cleanupHTML(doc):
     # Cleanup done immediately before serialization.
 
@@ -2001,6 +2026,8 @@ def cleanupHTML(doc):
 
 def finalHackyCleanup(text):
     # For hacky last-minute string-based cleanups of the rendered html.
+    # The html is streamed through this a chunk at a time,
+    # and chunks only break at newlines, so cleanups can't span lines.
 
     return text
 
@@ -2024,6 +2051,7 @@ def processInclusions(doc):
                 macros[k.lower()] = v
             if el.get("path"):
                 path = el.get("path")
+                doc.dependencies.add(os.path.abspath(path))
                 try:
                     with io.open(path, 'r', encoding="utf-8") as f:
                         lines = f.readlines()
@@ -2113,25 +2141,34 @@ def inlineRemoteIssues(doc):
 
     # Right now, only github inline issues are supported.
     # More can be supported when someone cares.
-    for el in findAll("[data-inline-github]", doc):
+
+    # All the issues are fetched at once, concurrently.
+    # Recently-fetched issues aren't asked for again,
+    # so rebuilding in watch mode doesn't eat into the rate limit.
+    els = findAll("[data-inline-github]", doc)
+    headers = {"Accept": "application/vnd.github.v3.html+json"}
+    if doc.token is not None:
+        headers["Authorization"] = "token " + doc.token
+    requests = []
+    for el in els:
         user, repo, id = el.get('data-inline-github').split()
-        headers = {"Accept": "application/vnd.github.v3.html+json"}
-        if doc.token is not None:
-            headers["Authorization"] = "token " + doc.token
+        requests.append(("https://api.github.com/repos/{0}/{1}/issues/{2}".format(user, repo, id), headers))
+    responses = doc.fetcher.fetchAll(requests, maxAge=60)
+
+    for el, response in zip(els, responses):
         removeAttr(el, "data-inline-github")
-        req = urllib2.Request(url="https://api.github.com/repos/{0}/{1}/issues/{2}".format(user, repo, id),
-            headers=headers)
         try:
-            with closing(urllib2.urlopen(req)) as fh:
-                issue = json.load(fh)
-                clearContents(el)
-                appendChild(el,
-                    E.a({"href":issue['html_url'], "class":"marker"},
-                        "Issue #{0} on GitHub: “{1}”".format(issue['number'], issue['title'])),
-                    *parseHTML(issue['body_html']))
-                if el.tag == "p":
-                    el.tag = "div"
-                addClass(el, "no-marker")
+            if isinstance(response, Exception):
+                raise response
+            issue = response.json()
+            clearContents(el)
+            appendChild(el,
+                E.a({"href":issue['html_url'], "class":"marker"},
+                    "Issue #{0} on GitHub: “{1}”".format(issue['number'], issue['title'])),
+                *parseHTML(issue['body_html']))
+            if el.tag == "p":
+                el.tag = "div"
+            addClass(el, "no-marker")
         except urllib2.HTTPError as err:
             if doc.token and err.code == 401:
                 die("Unauthorized Access to GitHub's API. There might be an issue with your token.")
@@ -10,6 +10,6 @@
 #  [1] http://www.w3.org/Consortium/Legal/2002/copyright-software-20021231 
 #
 
-__all__ = ['apiclient', 'uritemplate']
+__all__ = ['apiclient', 'jsonstream', 'uritemplate']
 
 import apiclient
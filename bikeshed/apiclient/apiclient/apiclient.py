@@ -22,6 +22,7 @@ import collections
 import UserString
 
 import uritemplate
+import jsonstream
 
 class MimeType(UserString.MutableString):
     def __init__(self, mimeType):
@@ -87,17 +88,29 @@ class MimeType(UserString.MutableString):
 
 
 class APIResponse(object):
-    def __init__(self, response):
+    def __init__(self, response, stream = False):
         self.status = response.getcode() if (response) else 0
         self.headers = response.info() if (response) else {}
-        self.data = response.read() if (200 == self.status) else None
+        self.data = response.read() if ((200 == self.status) and (not stream)) else None
+        self.stream = None  # JSONStream over the body, in stream mode
+        self._response = response if (stream) else None
 
-        if (self.data and
-            (('json' == self.contentType.structure) or ('json-home' == self.contentType.structure))):
+        if (self.data and self._isJSON()):
             try:
                 self.data = json.loads(self.data, object_pairs_hook = collections.OrderedDict)
             except:
                 pass
+        if (stream and (200 == self.status) and self._isJSON()):
+            self.stream = jsonstream.JSONStream(response, self.encoding)
+
+    def _isJSON(self):
+        return (('json' == self.contentType.structure) or ('json-home' == self.contentType.structure))
+
+    def close(self):
+        # in stream mode, the connection is left open until the response is closed
+        if (self._response):
+            self._response.close()
+            self._response = None
 
     @property
     def contentType(self):
@@ -112,6 +125,18 @@ class APIResponse(object):
             if ('=' in encoding):
                 return encoding.split('=', 1)[1].strip()
         return 'utf-8'
+
+    @property
+    def etag(self):
+        return self.headers.get('etag') if (self.headers) else None
+
+    @property
+    def lastModified(self):
+        return self.headers.get('last-modified') if (self.headers) else None
+
+    @property
+    def notModified(self):
+        return (304 == self.status)
     
 
 class APIHints(object):
@@ -157,12 +182,13 @@ class APIResource(object):
 
 
 class APIClient(object):
-    def __init__(self, baseURI, version = None, username = None, password = None):
+    def __init__(self, baseURI, version = None, username = None, password = None, opener = None):
         self._baseURI = baseURI
         self.defaultVersion = version
         self.defaultAccept = 'application/json'
         self.username = username
         self.password = password
+        self.opener = opener    # urllib2 OpenerDirector to make requests with, defaults to urllib2.urlopen
         self._resources = {}
         self._versions = {}
         self._accepts = {}
@@ -217,22 +243,31 @@ class APIClient(object):
             version = self.defaultVersion
         return ('application/' + version + '+json, application/json') if (version) else 'application/json'
 
-    def _callURI(self, method, uri, accept, payload = None, payloadType = None):
+    def _callURI(self, method, uri, accept, payload = None, payloadType = None, headers = None, stream = False):
         try:
             request = urllib2.Request(uri, data = payload, headers = { 'Accept' : accept })
             if (self.username and self.password):
                 request.add_header('Authorization', b'Basic ' + base64.b64encode(self.username + b':' + self.password))
             if (payload and payloadType):
                 request.add_header('Content-Type', payloadType)
+            if (headers):
+                for header in headers:
+                    request.add_header(header, headers[header])
             request.get_method = lambda: method
             
-            with contextlib.closing(urllib2.urlopen(request)) as response:
+            response = self.opener.open(request) if (self.opener) else urllib2.urlopen(request)
+            if (stream):
+                return APIResponse(response, stream = True)
+            with contextlib.closing(response):
                 return APIResponse(response)
+        except urllib2.HTTPError as e:
+            if (304 == e.code):     # conditional request, resource unchanged
+                return APIResponse(e)
         except Exception as e:
             pass
         return None
     
-    def _call(self, method, name, arguments, payload = None, payloadType = None):
+    def _call(self, method, name, arguments, payload = None, payloadType = None, headers = None, stream = False):
         apiKey = urlparse.urljoin(self.baseURI, name)
 
         resource = self._resources.get(apiKey)
@@ -243,7 +278,7 @@ class APIClient(object):
                 accept = MimeType(self._accepts(apiKey) if (apiKey in self._accepts) else self.defaultAccept)
                 if (version):
                     accept.subtype = version
-                return self._callURI(method, uri, accept, payload, payloadType)
+                return self._callURI(method, uri, accept, payload, payloadType, headers, stream)
         return None
     
     def setVersion(self, name, version):
@@ -254,9 +289,21 @@ class APIClient(object):
         apiKey = urlparse.urljoin(self.baseURI, name)
         self._accepts[apiKey] = mimeType
 
-    def get(self, name, **kwargs):
-        return self._call('GET', name, kwargs)
+    def get(self, name, stream = False, **kwargs):
+        # with stream, the JSON body is parsed incrementally through the response's stream,
+        # rather than all at once into its data, and the response must be closed when done
+        return self._call('GET', name, kwargs, stream = stream)
     
+    def getIfChanged(self, name, etag = None, lastModified = None, stream = False, **kwargs):
+        # conditional GET, pass the etag and/or lastModified of a previous response
+        # if the resource hasn't changed since, the response's notModified is True and it has no data
+        headers = {}
+        if (etag):
+            headers['If-None-Match'] = etag
+        if (lastModified):
+            headers['If-Modified-Since'] = lastModified
+        return self._call('GET', name, kwargs, headers = headers, stream = stream)
+
     def postForm(self, name, payload = None, **kwargs):
         return self._call('POST', name, kwargs, urllib.urlencode(payload), 'application/x-www-form-urlencoded')
 
@@ -0,0 +1,164 @@
+# coding=utf-8
+#
+#  Copyright © 2013 Hewlett-Packard Development Company, L.P.
+#
+#  This work is distributed under the W3C® Software License [1]
+#  in the hope that it will be useful, but WITHOUT ANY
+#  WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  [1] http://www.w3.org/Consortium/Legal/2002/copyright-software-20021231
+#
+
+# Incremental JSON parsing, for documents too large to comfortably hold in memory at once
+#
+# Reads from a file-like object a chunk at a time, and either:
+#   events() - generates (event, value) pairs for the whole document, like a SAX parser:
+#       ('start_map', None), ('map_key', key), ('end_map', None),
+#       ('start_array', None), ('end_array', None),
+#       ('string', value), ('number', value), ('boolean', value), ('null', None)
+#   items() - generates (key, value) pairs for the members of the top-level object,
+#       each value fully parsed, so only one member needs to be in memory at a time
+
+
+import re
+import json
+import codecs
+import collections
+
+
+class JSONStream(object):
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _token = re.compile(r'[ \t\n\r]*(?:([{}\[\],:])|"([^"\\]*(?:\\.[^"\\]*)*)"|'
+                        r'(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)|(true|false|null))', re.DOTALL)
+    _literals = {'true': True, 'false': False, 'null': None}
+    _numberChars = frozenset('0123456789.eE+-')
+
+    def __init__(self, file, encoding = 'utf-8', chunkSize = 65536, object_pairs_hook = collections.OrderedDict):
+        self._file = file
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._chunkSize = chunkSize
+        self._jsonDecoder = json.JSONDecoder(object_pairs_hook = object_pairs_hook)
+        self._buffer = u''
+        self._index = 0
+        self._eof = False
+
+    def _read(self, size = None):
+        # drop what's been consumed, and append the next chunk
+        data = self._file.read(size or self._chunkSize)
+        self._eof = (not data)
+        self._buffer = self._buffer[self._index:] + self._decoder.decode(data, self._eof)
+        self._index = 0
+
+    def _mayContinue(self, end):
+        # whether a value ending here could have been cut short by the end of the buffer,
+        # like a number followed by more digits in the next chunk
+        return ((end == len(self._buffer)) or (self._buffer[end] in self._numberChars))
+
+    def _error(self, message):
+        return ValueError(message + ' near: ' + repr(self._buffer[self._index:self._index + 40]))
+
+    def _nextToken(self):
+        # returns (kind, value), kind being the structural character, or '"', '0', or 'literal'
+        # (None, None) at the end of the document
+        while True:
+            match = self._token.match(self._buffer, self._index)
+            # a token reaching the end of the buffer may continue into the next chunk
+            if ((not match) or (match.end() == len(self._buffer)) or (match.group(3) and self._mayContinue(match.end()))) and (not self._eof):
+                self._read()
+                continue
+            if (not match):
+                self._index = self._whitespace.match(self._buffer, self._index).end()
+                if (self._index < len(self._buffer)):
+                    raise self._error('Invalid JSON')
+                return (None, None)
+            self._index = match.end()
+            if (match.group(1)):
+                return (match.group(1), None)
+            if (match.group(2) is not None):
+                string = match.group(2)
+                if ('\\' in string):
+                    string = json.decoder.scanstring(self._buffer, match.start(2))[0]
+                return ('"', string)
+            if (match.group(3)):
+                number = match.group(3)
+                return ('0', float(number) if (('.' in number) or ('e' in number) or ('E' in number)) else int(number))
+            return ('literal', self._literals[match.group(4)])
+
+    def _expect(self, expected):
+        kind, value = self._nextToken()
+        if (kind not in expected):
+            raise self._error('Expected ' + ' or '.join(expected))
+        return kind, value
+
+    def events(self):
+        # each open container is [kind, state], the state being
+        # 'start', 'next' (after a comma), or 'done' (after a value)
+        # the document itself is a container holding one value
+        stack = [['', 'start']]
+        while True:
+            kind, value = self._nextToken()
+            container = stack[-1]
+            closer = {'{': '}', '[': ']'}.get(container[0])
+            if (kind is None):
+                if ((1 < len(stack)) or ('done' != container[1])):
+                    raise self._error('Unexpected end of JSON')
+                return
+            if (closer and (closer == kind) and ('next' != container[1])):
+                stack.pop()
+                stack[-1][1] = 'done'
+                yield ('end_map' if ('}' == kind) else 'end_array', None)
+                continue
+            if ('done' == container[1]):
+                if ((',' != kind) or (not closer)):
+                    raise self._error('Expected , or ' + (closer or 'end of JSON'))
+                container[1] = 'next'
+                continue
+            if ('{' == container[0]):
+                if ('"' != kind):
+                    raise self._error('Expected object key')
+                yield ('map_key', value)
+                self._expect(':')
+                kind, value = self._nextToken()
+            if (kind in ('{', '[')):
+                stack.append([kind, 'start'])
+                yield ('start_map' if ('{' == kind) else 'start_array', None)
+            elif (kind in ('"', '0', 'literal')):
+                container[1] = 'done'
+                if ('"' == kind):
+                    yield ('string', value)
+                elif ('0' == kind):
+                    yield ('number', value)
+                elif (value is None):
+                    yield ('null', None)
+                else:
+                    yield ('boolean', value)
+            else:
+                raise self._error('Unexpected ' + (kind or 'end of JSON'))
+
+    def _value(self):
+        # parses one complete value with the json module, reading more until it fits in the buffer
+        while True:
+            self._index = self._whitespace.match(self._buffer, self._index).end()
+            try:
+                value, end = self._jsonDecoder.raw_decode(self._buffer, self._index)
+                if ((not self._mayContinue(end)) or self._eof):
+                    self._index = end
+                    return value
+            except ValueError:
+                if (self._eof):
+                    raise
+            # at least double the buffer, so large values are reparsed only a few times
+            self._read(max(self._chunkSize, len(self._buffer) - self._index))
+
+    def items(self):
+        self._expect('{')
+        kind, key = self._expect('"}')
+        while ('"' == kind):
+            self._expect(':')
+            yield (key, self._value())
+            if ('}' == self._expect(',}')[0]):
+                break
+            kind, key = self._expect('"')
+        if (self._nextToken()[0] is not None):
+            raise self._error('Extra data after JSON')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import os
+import glob
+import time
+import multiprocessing
+
+from . import config
+from .messages import *
+from .ReferenceManager import ReferenceManager
+
+'''
+Builds lots of specs at once, across a pool of worker processes.
+
+The global reference data is loaded once, in the parent,
+before the pool is started,
+and handed to each worker by the pool's initializer.
+The workers are forked from the parent, so they all share that memory copy-on-write
+rather than each loading their own copy.
+(This relies on fork(), so on platforms without it
+the workers are started fresh, and each loads the data itself instead.)
+'''
+
+# Set in each worker by _initWorker(), when the pool starts it.
+_constructor = None
+_baseRefs = None
+
+def batch(constructor, patterns, jobs=None):
+    filenames = sorted(set(os.path.abspath(f) for pattern in patterns for f in glob.glob(pattern)))
+    if not filenames:
+        die("No spec source files matched {0}.", ", ".join(patterns))
+        return False
+
+    if hasattr(os, "fork"):
+        say("Loading reference data...")
+        baseRefs = ReferenceManager()
+        baseRefs.loadGlobalData()
+    else:
+        # The workers are spawned fresh, and would have to unpickle a copy anyway.
+        baseRefs = None
+
+    start = time.time()
+    failures = 0
+    pool = multiprocessing.Pool(jobs, initializer=_initWorker, initargs=(constructor, baseRefs))
+    try:
+        for filename, ok, elapsed, summary in pool.imap_unordered(buildFile, filenames):
+            if ok:
+                success("{0} ({1:.2f}s){2}", filename, elapsed, summary)
+            else:
+                failures += 1
+                failure("{0} ({1:.2f}s){2}", filename, elapsed, summary)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    say("Built {0} specs in {1:.2f}s, {2} failed.", len(filenames), time.time() - start, failures)
+    return failures == 0
+
+
+def _initWorker(constructor, baseRefs):
+    # Runs in each worker, as it starts.
+    global _constructor, _baseRefs
+    if baseRefs is None:
+        baseRefs = ReferenceManager()
+        baseRefs.loadGlobalData()
+    _constructor = constructor
+    _baseRefs = baseRefs
+
+
+def buildFile(filename):
+    # Runs in a worker.
+    # Per-spec messages would interleave unreadably across workers,
+    # so they're silenced and summarized instead.
+    config.quiet = float("infinity")
+    resetSeenMessages()
+    start = time.time()
+    cwd = os.getcwd()
+    try:
+        os.chdir(os.path.dirname(filename))
+        doc = _constructor(inputFilename=os.path.basename(filename), baseRefs=_baseRefs)
+        if not doc.valid:
+            return filename, False, time.time() - start, ": couldn't read the file"
+        doc.preprocess()
+        doc.finish(outputFilename=None)
+    except Exception, e:
+        return filename, False, time.time() - start, ": {0}".format(e)
+    finally:
+        os.chdir(cwd)
+    counts = [(messageCounts[kind], label) for kind, label in (("fatal", "fatal errors"), ("linkerror", "linking errors"), ("warning", "warnings"))]
+    summary = ", ".join("{0} {1}".format(count, label) for count, label in counts if count)
+    return filename, messageCounts["fatal"] == 0, time.time() - start, ", with " + summary if summary else ""
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import division, unicode_literals
+import io
 import re
 import copy
+import struct
 from collections import defaultdict, deque
+from . import config
+from . import dataindex
+from . import fuzzy
 from .messages import *
 from .htmlhelpers import *
 
@@ -340,25 +345,114 @@ def loadBiblioDataFile(lines, storage):
         pass
 
 
-def levenshtein(a,b):
-    "Calculates the Levenshtein distance between a and b."
-    n, m = len(a), len(b)
-    if n > m:
-        # Make sure n <= m, to use O(min(n,m)) space
-        a,b = b,a
-        n,m = m,n
+def scanBiblioDataFile(fh):
+    '''
+    Finds where each entry in a biblio data file is, without decoding any of them.
+    Returns {key bytes => [(offset, length)]};
+    a key can have several entries, so it's a list.
+    '''
+    ranges = defaultdict(list)
+    offset = 0
+    lines = iter(fh)
+    try:
+        while True:
+            start = offset
+            fullKey = lines.next()
+            offset += len(fullKey)
+            # Mirrors the record structure that loadBiblioDataFile() expects.
+            if fullKey[0:1] == b"d":
+                for _ in range(8):
+                    offset += len(lines.next())
+                while True:
+                    line = lines.next()
+                    offset += len(line)
+                    if line == b"-\n":
+                        break
+            else:
+                for _ in range(3):
+                    offset += len(lines.next())
+            ranges[fullKey[2:].strip()].append((start, offset - start))
+    except StopIteration:
+        pass
+    return ranges
+
+
+class BiblioIndex(object):
+    '''
+    The global biblio data, in biblio.data,
+    read through an index of where each key's entries are in the file.
+    Looking up a key reads and decodes only that key's entries.
 
-    current = range(n+1)
-    for i in range(1,m+1):
-        previous, current = current, [i]+[0]*n
-        for j in range(1,n+1):
-            add, delete = previous[j]+1, current[j-1]+1
-            change = previous[j-1]
-            if a[j-1] != b[i-1]:
-                change = change + 1
-            current[j] = min(add, delete, change)
+    The index is biblio.index if it's usable (or can be rebuilt),
+    or else an in-memory one from scanning the data file.
+    Either way, the full set of keys is never loaded into Python objects.
+
+    The data file is kept open, and the index is checked against that open file,
+    so lookups keep reading the data the index was built from
+    even if `bikeshed update` replaces biblio.data in the meantime.
+    '''
+    rangeFormat = str("<II")
+    rangeSize = struct.calcsize(rangeFormat)
+
+    def __init__(self):
+        with config.retrieveDataFile("biblio.data", quiet=True) as fh:
+            sourcePath = fh.name
+        self.sourceFile = io.open(sourcePath, 'rb')
+        indexPath = config.scriptPath + "/spec-data/biblio.index"
+        self.index = dataindex.openIndex(indexPath, self.sourceFile)
+        if self.index is None and not config.dryRun:
+            # Missing or stale, so (re)build it from the biblio data.
+            try:
+                writeBiblioIndex(self.sourceFile, indexPath)
+                self.index = dataindex.openIndex(indexPath, self.sourceFile)
+            except (IOError, OSError):
+                pass
+        if self.index is None:
+            self.sourceFile.seek(0)
+            self.index = encodeBiblioRanges(scanBiblioDataFile(self.sourceFile))
+        self._fuzzyIndex = None
+
+    def __contains__(self, key):
+        return key.encode("utf-8") in self.index
+
+    def keys(self):
+        for key in self.index.keys():
+            yield key.decode("utf-8")
+
+    def __iter__(self):
+        return self.keys()
+
+    def fuzzyIndex(self):
+        # Built the first time it's asked for, then shared by every build using this index.
+        if self._fuzzyIndex is None:
+            self._fuzzyIndex = fuzzy.NgramIndex(self.keys())
+        return self._fuzzyIndex
+
+    def load(self, key, storage):
+        # Decodes the entries for key into storage, like loadBiblioDataFile().
+        data = self.index.get(key.encode("utf-8"))
+        if data is None:
+            return
+        for i in range(0, len(data), self.rangeSize):
+            offset, length = struct.unpack_from(self.rangeFormat, data, i)
+            self.sourceFile.seek(offset)
+            loadBiblioDataFile(io.BytesIO(self.sourceFile.read(length)), storage)
+
+
+def encodeBiblioRanges(ranges):
+    return {key: b"".join(struct.pack(BiblioIndex.rangeFormat, *r) for r in rs) for key, rs in ranges.items()}
+
+
+def writeBiblioIndex(source, indexPath):
+    # The source is the path of the biblio data, or the data file itself, already open.
+    if hasattr(source, "read"):
+        source.seek(0)
+        ranges = scanBiblioDataFile(source)
+    else:
+        with io.open(source, 'rb') as fh:
+            ranges = scanBiblioDataFile(fh)
+    dataindex.writeIndex(indexPath, encodeBiblioRanges(ranges), source)
 
-    return current[n]
 
 def findCloseBiblios(biblioKeys, target, n=5):
     '''
@@ -367,25 +461,9 @@ def findCloseBiblios(biblioKeys, target, n=5):
     plus the 5 closest ones per levenshtein distance.
     '''
     target = target.lower()
-    names = []
-    superStrings = []
-    def addName(name, distance):
-        tuple = (name, distance)
-        if len(names) < n:
-            names.append(tuple)
-            names.sort(key=lambda x:x[1])
-        elif distance >= names[-1][1]:
-            pass
-        else:
-            for i, entry in enumerate(names):
-                if distance < entry[1]:
-                    names.insert(i, tuple)
-                    names.pop()
-                    break
-        return names
-    for name in biblioKeys:
-        if target in name:
-            superStrings.append(name)
-        else:
-            addName(name, levenshtein(name, target))
-    return sorted(s.strip() for s in superStrings) + [n.strip() for n,d in names]
+    indexes = biblioKeys.fuzzyIndexes()
+    superStrings = set()
+    for index in indexes:
+        superStrings.update(index.containing(target))
+    names = fuzzy.closest(indexes, target, n, skip=lambda name: target in name)
+    return sorted(s.strip() for s in superStrings) + [name.strip() for _,name in names]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import hashlib
+
+from . import messages
+
+class BuildCache(object):
+    '''
+    Remembers the results of expensive, self-contained transforms
+    (data blocks, IDL markup, syntax highlighting),
+    keyed by a hash of everything the transform reads,
+    so rebuilding a lightly-edited spec can skip redoing the unchanged blocks.
+
+    A Spec keeps one of these across rebuilds (see Spec.watch()).
+    Results that weren't used by the latest build are dropped by finishBuild(),
+    so the cache stays the size of a single build.
+
+    Transforms that emit any messages aren't cached,
+    so a rebuild still reports every error and warning.
+    '''
+    def __init__(self):
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, parts):
+        hash = hashlib.sha1(kind.encode("utf-8"))
+        for part in parts:
+            hash.update(b"\0")
+            hash.update(part.encode("utf-8"))
+        return hash.digest()
+
+    def has(self, kind, parts):
+        key = self.key(kind, parts)
+        return key in self.used or key in self.entries
+
+    def cached(self, kind, parts, compute):
+        # Returns compute()'s result for the given inputs,
+        # reusing a previous result if the inputs are unchanged.
+        key = self.key(kind, parts)
+        if key in self.used:
+            self.hits += 1
+            return self.used[key]
+        if key in self.entries:
+            self.hits += 1
+            self.used[key] = self.entries[key]
+            return self.used[key]
+        self.misses += 1
+        emittedBefore = sum(messages.emittedCounts.values())
+        result = compute()
+        if sum(messages.emittedCounts.values()) == emittedBefore:
+            self.used[key] = result
+        return result
+
+    def finishBuild(self):
+        self.entries = self.used
+        self.used = {}
@@ -264,8 +264,11 @@ def retrieveBoilerplateFile(self, name, group=None, status=None, error=True):
     filenames.append(os.path.join(includeFolder, statusFile))
     filenames.append(os.path.join(includeFolder, genericFile))
 
+    # Local files can be added at any time to override the defaults, so watch for those too.
+    self.dependencies.update(filenames[:2])
     for filename in filenames:
         if os.path.isfile(filename):
+            self.dependencies.add(filename)
             try:
                 with io.open(filename, 'r', encoding="utf-8") as fh:
                     return fh.read()
@@ -63,33 +63,30 @@ def transformDataBlocks(doc, lines):
             if startLine == i:
                 # Single-line <pre>.
                 match = re.match(r"\s*(<{0}[^>]*>)(.*)</{0}>(.*)".format(tagName), line, re.I)
-                repl = blockTypes[blockType](
+                repl = transformBlock(doc, blockType, blockTypes[blockType],
                         lines=[match.group(2)],
                         tagName=tagName,
-                        firstLine=match.group(1),
-                        doc=doc)
+                        firstLine=match.group(1))
                 newLines.extend(repl)
                 newLines.append("<!--line count correction {0}-->".format(-len(repl)-1))
                 newLines.append(match.group(3))
             elif re.match(r"^\s*$", match.group(1)):
                 # End tag was the first tag on the line.
                 # Remove the tag from the line.
-                repl = blockTypes[blockType](
+                repl = transformBlock(doc, blockType, blockTypes[blockType],
                         lines=lines[startLine+1:i],
                         tagName=tagName,
-                        firstLine=lines[startLine],
-                        doc=doc)
+                        firstLine=lines[startLine])
                 newLines.extend(repl)
                 newLines.append("<!--line count correction {0}-->".format((i - startLine)-len(repl)-1))
                 newLines.append(match.group(2))
             else:
                 # End tag was at the end of line of useful content.
                 # Process the stuff before it, preserve the stuff after it.
-                repl = blockTypes[blockType](
+                repl = transformBlock(doc, blockType, blockTypes[blockType],
                         lines=lines[startLine+1:i]+[match.group(1)],
                         tagName=tagName,
-                        firstLine=lines[startLine],
-                        doc=doc)
+                        firstLine=lines[startLine])
                 newLines.extend(repl)
                 newLines.append("<!--line count correction {0}-->".format((i - startLine)-len(repl)-1))
                 newLines.append(match.group(2))
@@ -103,6 +100,52 @@ def transformDataBlocks(doc, lines):
     return newLines
 
 
+# Block types whose output depends only on the block itself,
+# so it can be reused when the block hasn't changed between builds.
+cacheableBlockTypes = frozenset(["propdef", "descdef", "elementdef", "argumentdef", "railroad"])
+
+def transformBlock(doc, blockType, transform, lines, tagName, firstLine):
+    if blockType not in cacheableBlockTypes:
+        return transform(lines=lines, tagName=tagName, firstLine=firstLine, doc=doc)
+    def run():
+        # Some blocks add to the doc's styles, which have to be replayed when the block is reused.
+        # Every style the block sets is recorded, even if an earlier block already set it,
+        # since that earlier block might be gone in the next build.
+        styles = doc.extraStyles
+        doc.extraStyles = RecordingDict(styles)
+        try:
+            repl = transform(lines=lines, tagName=tagName, firstLine=firstLine, doc=doc)
+            return repl, doc.extraStyles.assigned
+        finally:
+            doc.extraStyles = styles
+    repl, newStyles = doc.cache.cached("datablock", [blockType, tagName, firstLine] + lines, run)
+    # (Assigned one by one, since update() can reorder the dict, and thus the output styles.)
+    for k,v in newStyles.items():
+        doc.extraStyles[k] = v
+    return repl
+
+
+class RecordingDict(object):
+    # Passes everything through to the wrapped dict,
+    # remembering each key/value assigned through it, in order.
+    def __init__(self, data):
+        self.data = data
+        self.assigned = OrderedDict()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.assigned[key] = value
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getattr__(self, name):
+        return getattr(self.data, name)
+
+
 def transformPre(lines, tagName, firstLine, **kwargs):
     # If the last line in the source is a </code></pre>,
     # the generic processor will turn that into a final </code> line,
@@ -409,7 +452,7 @@ def processAnchors(anchors, doc):
         url = urlPrefix + ("" if "#" in urlPrefix or "#" in urlSuffix else "#") + urlSuffix
         if anchor['type'][0] in config.lowercaseTypes:
             anchor['text'][0] = anchor['text'][0].lower()
-        doc.refs.refs[anchor['text'][0]].append({
+        doc.refs.addRef(anchor['text'][0], {
             "linkingText": anchor['text'][0],
             "type": anchor['type'][0],
             "url": url,
@@ -469,10 +512,7 @@ def processIgnoredSpecs(specs, doc):
             continue
         replacedBy = spec.get('replacedBy')[0] if 'replacedBy' in spec else None
         for specName in specNames:
-            if replacedBy:
-                doc.refs.replacedSpecs.add((specName, replacedBy))
-            else:
-                doc.refs.ignoredSpecs.add(specName)
+            doc.refs.ignoreSpec(specName, replacedBy)
     return []
 
 
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import io
+import os
+import mmap
+import struct
+import threading
+
+'''
+A compact, memory-mappable index over a keyed data file.
+
+The index is derived from a "source" data file (like anchors.data),
+and remembers the size and mtime of the source it was built from,
+so a stale index (say, after `bikeshed update` or a data-file version bump)
+is detected and ignored rather than trusted.
+
+Layout (all integers little-endian):
+
+header:  magic, format version, source size, source mtime, key count
+records: one fixed-width (keyOffset, keyLength, dataOffset, dataLength) per key,
+         sorted by the utf-8 bytes of the key
+strings: the keys, followed by the data for each key
+
+Lookups binary-search the records directly in the mmap,
+so opening an index costs nothing beyond mapping the file,
+and only the records actually asked for are ever read.
+'''
+
+magic = b"BSIX"
+formatVersion = 1
+headerFormat = str("<4sIQQI")
+headerSize = struct.calcsize(headerFormat)
+recordFormat = str("<IIII")
+recordSize = struct.calcsize(recordFormat)
+
+
+def sourceSignature(source):
+    # The source is a path, or a file that's already open
+    # (which might no longer be the file at its path).
+    if hasattr(source, "fileno"):
+        stat = os.fstat(source.fileno())
+    else:
+        stat = os.stat(source)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def writeIndex(indexPath, entries, source):
+    '''
+    Writes an index file for the {key bytes => data bytes} entries,
+    stamped with the signature of the source (a path or an open file).
+    The file is written to a temp file unique to this process and thread,
+    then moved into place, so a concurrently-running build never sees a half-written index,
+    and two builds rebuilding the same stale index don't write into each other's temp file.
+    '''
+    keys = sorted(entries.keys())
+    size, mtime = sourceSignature(source)
+    stringsStart = headerSize + recordSize * len(keys)
+    records = []
+    offset = stringsStart
+    for key in keys:
+        records.append([offset, len(key), 0, len(entries[key])])
+        offset += len(key)
+    for record, key in zip(records, keys):
+        record[2] = offset
+        offset += len(entries[key])
+    tempPath = "{0}.{1}.{2}.tmp".format(indexPath, os.getpid(), threading.current_thread().ident)
+    try:
+        with io.open(tempPath, 'wb') as fh:
+            fh.write(struct.pack(headerFormat, magic, formatVersion, size, mtime, len(keys)))
+            for record in records:
+                fh.write(struct.pack(recordFormat, *record))
+            for key in keys:
+                fh.write(key)
+            for key in keys:
+                fh.write(entries[key])
+        try:
+            os.rename(tempPath, indexPath)
+        except OSError:
+            # Windows won't rename over an existing file.
+            os.remove(indexPath)
+            os.rename(tempPath, indexPath)
+    finally:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+
+
+def openIndex(indexPath, source):
+    # Returns a DataIndex, or None if the index is missing or doesn't match its source,
+    # a path or an open file.
+    try:
+        with io.open(indexPath, 'rb') as fh:
+            header = fh.read(headerSize)
+            if len(header) < headerSize:
+                return None
+            fileMagic, version, size, mtime, count = struct.unpack(headerFormat, header)
+            if fileMagic != magic or version != formatVersion:
+                return None
+            if (size, mtime) != sourceSignature(source):
+                return None
+            if count == 0:
+                return DataIndex(None, 0)
+            return DataIndex(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ), count)
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+
+class DataIndex(object):
+    def __init__(self, data, count):
+        self.data = data
+        self.count = count
+
+    def _record(self, i):
+        return struct.unpack_from(recordFormat, self.data, headerSize + recordSize * i)
+
+    def _key(self, record):
+        return self.data[record[0]:record[0]+record[1]]
+
+    def _find(self, key):
+        # Binary search for the record with the given key bytes.
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._record(mid)
+            midKey = self._key(record)
+            if midKey < key:
+                lo = mid + 1
+            elif midKey > key:
+                hi = mid
+            else:
+                return record
+        return None
+
+    def get(self, key, default=None):
+        record = self._find(key)
+        if record is None:
+            return default
+        return self.data[record[2]:record[2]+record[3]]
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self.count
+
+    def keys(self):
+        for i in xrange(self.count):
+            yield self._key(self._record(i))
+
+    def __iter__(self):
+        return self.keys()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import io
+import os
+import json
+import time
+import errno
+import hashlib
+import urllib2
+import threading
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
+
+from . import config
+
+'''
+Fetches URLs, several at a time, with an on-disk HTTP cache.
+
+Requests go through a urllib2 opener,
+so the HTTP layer can be swapped out
+(say, for one whose handlers redirect to a local stand-in server)
+by passing a different opener to the Fetcher.
+
+Responses that came with an ETag or Last-Modified header are cached
+in spec-data/cache/http/, and later fetches of the same URL
+send a conditional request, which costs (nearly) nothing if it's unchanged.
+Passing maxAge skips even that, for responses cached recently enough.
+'''
+
+class Response(object):
+    def __init__(self, url, body, etag=None, lastModified=None, fetched=None, fromCache=False):
+        self.url = url
+        # bytes
+        self.body = body
+        self.etag = etag
+        self.lastModified = lastModified
+        # When the body was last confirmed to be current.
+        self.fetched = time.time() if fetched is None else fetched
+        self.fromCache = fromCache
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8")
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+
+class Fetcher(object):
+    def __init__(self, opener=None, cacheDir=None, maxConnections=8, timeout=None):
+        self.opener = opener or urllib2.build_opener()
+        if cacheDir is None:
+            cacheDir = os.path.join(config.scriptPath, "spec-data", "cache", "http")
+        # cacheDir=False disables the cache.
+        self.cacheDir = cacheDir or None
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+
+    def fetch(self, url, headers=None, maxAge=0):
+        # Returns a Response, or raises urllib2's errors like urlopen() does.
+        headers = dict(headers or {})
+        key = cacheKey(url, headers)
+        cached = self._readCache(key)
+        if cached and maxAge and time.time() - cached.fetched < maxAge:
+            return cached
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.lastModified:
+            headers["If-Modified-Since"] = cached.lastModified
+        req = urllib2.Request(url=url, headers=headers)
+        try:
+            if self.timeout is None:
+                fh = self.opener.open(req)
+            else:
+                fh = self.opener.open(req, timeout=self.timeout)
+            with closing(fh):
+                body = fh.read()
+                info = fh.info()
+        except urllib2.HTTPError, e:
+            if e.code == 304 and cached:
+                cached.fetched = time.time()
+                self._writeCache(key, cached, metadataOnly=True)
+                return cached
+            raise
+        response = Response(url, body, etag=info.getheader(str("ETag")), lastModified=info.getheader(str("Last-Modified")))
+        if response.etag or response.lastModified or maxAge:
+            self._writeCache(key, response)
+        return response
+
+    def fetchAll(self, requests, maxAge=0):
+        # Takes a list of (url, headers), and fetches them concurrently,
+        # at most maxConnections at a time.
+        # Returns a list, in the same order, of either each Response,
+        # or the exception that fetching it raised.
+        def fetchOne(request):
+            url, headers = request
+            try:
+                return self.fetch(url, headers, maxAge=maxAge)
+            except Exception, e:
+                return e
+        if len(requests) <= 1:
+            return map(fetchOne, requests)
+        pool = ThreadPool(min(self.maxConnections, len(requests)))
+        try:
+            return pool.map(fetchOne, requests)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _cachePath(self, key, ext):
+        return os.path.join(self.cacheDir, key[:2], key[2:] + ext)
+
+    def _readCache(self, key):
+        if self.cacheDir is None:
+            return None
+        try:
+            with io.open(self._cachePath(key, ".json"), "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            with io.open(self._cachePath(key, ".body"), "rb") as fh:
+                body = fh.read()
+        except (IOError, ValueError):
+            return None
+        return Response(meta["url"], body, etag=meta["etag"], lastModified=meta["lastModified"], fetched=meta["fetched"], fromCache=True)
+
+    def _writeCache(self, key, response, metadataOnly=False):
+        # The cache is only an optimization,
+        # so failing to write it (read-only install, etc) isn't an error.
+        if self.cacheDir is None:
+            return
+        meta = json.dumps({"url": response.url, "etag": response.etag, "lastModified": response.lastModified, "fetched": response.fetched})
+        try:
+            # The body goes first; the metadata file existing means the entry is complete.
+            if not metadataOnly:
+                atomicWrite(self._cachePath(key, ".body"), response.body)
+            atomicWrite(self._cachePath(key, ".json"), meta.encode("utf-8"))
+        except (IOError, OSError):
+            pass
+
+
+def cacheKey(url, headers):
+    hash = hashlib.sha1(url.encode("utf-8"))
+    for name, value in sorted(headers.items()):
+        hash.update(b"\0")
+        hash.update("{0}: {1}".format(name, value).encode("utf-8"))
+    return hash.hexdigest()
+
+
+def atomicWrite(path, data):
+    # Write then rename, so concurrent readers never see a partial file.
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+    tempPath = "{0}.{1}.{2}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+    with io.open(tempPath, "wb") as fh:
+        fh.write(data)
+    os.rename(tempPath, path)
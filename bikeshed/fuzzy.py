@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import bisect
+from collections import defaultdict
+
+'''
+"Did you mean" searches over large sets of strings,
+like the biblio keys or the linking texts of every anchor.
+
+An NgramIndex maps each n-gram (pair of characters) to the strings containing it.
+Counting the n-grams a target shares with a string gives a lower bound
+on their Levenshtein distance (each edit can only destroy q of the n-grams),
+so a search only has to compute real distances for the few strings
+whose bound could beat the best ones found so far.
+The results are exactly what comparing against every string would give.
+(Pairs, rather than trigrams, since they give much tighter bounds on short strings like biblio keys.)
+'''
+
+q = 2
+
+def ngrams(s):
+    # Padded, so the start and end of the string count for something.
+    s = "\x02" + s + "\x03"
+    return set(s[i:i+q] for i in range(len(s) - q + 1))
+
+
+def levenshtein(a, b, limit=None):
+    '''
+    Calculates the Levenshtein distance between a and b.
+    If limit is given, it can give up as soon as the distance must be greater than that,
+    returning limit+1.
+
+    Uses Myers' bit-parallel algorithm, treating a column of the usual table as the bits of an int,
+    so each character of b costs a handful of int operations rather than a loop over a.
+    '''
+    n, m = len(a), len(b)
+    if n > m:
+        a,b = b,a
+        n,m = m,n
+    if limit is not None and m - n > limit:
+        return limit + 1
+    if n == 0:
+        return m
+
+    # Bitmasks of where each character appears in a.
+    positions = {}
+    for i, char in enumerate(a):
+        positions[char] = positions.get(char, 0) | (1 << i)
+    full = (1 << n) - 1
+    last = 1 << (n - 1)
+    # The vertical deltas of the current column, +1 and -1.
+    plus, minus = full, 0
+    distance = n
+    for j, char in enumerate(b):
+        match = positions.get(char, 0)
+        xv = match | minus
+        xh = (((match & plus) + plus) ^ plus) | match
+        hPlus = minus | (~(xh | plus) & full)
+        hMinus = plus & xh
+        if hPlus & last:
+            distance += 1
+            if limit is not None and distance - (m - j - 1) > limit:
+                # Each remaining character can only bring it down by one.
+                return limit + 1
+        elif hMinus & last:
+            distance -= 1
+        hPlus = ((hPlus << 1) | 1) & full
+        hMinus = (hMinus << 1) & full
+        plus = hMinus | (~(xv | hPlus) & full)
+        minus = hPlus & xv
+    if limit is not None and distance > limit:
+        return limit + 1
+    return distance
+
+
+class NgramIndex(object):
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.gramCounts = []
+        # {n-gram => [positions in self.keys]}
+        self.postings = defaultdict(list)
+        # {length => [positions in self.keys]}
+        self.byLength = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            grams = ngrams(key)
+            self.gramCounts.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(i)
+            self.byLength[len(key)].append(i)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def containing(self, target):
+        return [key for key in self.keys if target in key]
+
+    def closest(self, target, n=5, maxDistance=None, skip=None):
+        '''
+        Returns [(distance, key)] for the (up to) n keys closest to target,
+        closest first, with ties broken by the key.
+        Keys further than maxDistance, or that skip(key) is true for, are left out.
+        '''
+        targetGrams = ngrams(target)
+        shared = defaultdict(int)
+        for gram in targetGrams:
+            for i in self.postings.get(gram, ()):
+                shared[i] += 1
+        # {number of shared n-grams => positions}
+        buckets = defaultdict(list)
+        for i, count in shared.iteritems():
+            buckets[count].append(i)
+
+        # The fewer n-grams a key shares, the higher its bound can be,
+        # so the keys are tried a bucket at a time, sharing the most first,
+        # until no key in a bucket could possibly be close enough.
+        best = []
+        for count in range(len(targetGrams), -1, -1):
+            limit = best[-1][0] if len(best) == n else maxDistance
+            if limit is not None and -(-(len(targetGrams) - count) // q) > limit:
+                break
+            if count:
+                positions = buckets.get(count, ())
+            elif limit is None:
+                positions = (i for i in xrange(len(self.keys)) if i not in shared)
+            else:
+                # Only keys within limit of the target's length can be close enough.
+                lengths = range(max(0, len(target) - limit), len(target) + limit + 1)
+                positions = (i for length in lengths for i in self.byLength.get(length, ()) if i not in shared)
+            self._search(target, self._bounds(target, targetGrams, positions, count), n, maxDistance, skip, best)
+        return best
+
+    def _bounds(self, target, targetGrams, positions, count):
+        # Returns [(lower bound on the distance, position)], smallest first,
+        # for keys that share count n-grams with the target.
+        targetCount = len(targetGrams)
+        targetLength = len(target)
+        bounds = []
+        for i in positions:
+            gramBound = -(-(max(self.gramCounts[i], targetCount) - count) // q)
+            lengthBound = abs(len(self.keys[i]) - targetLength)
+            bounds.append((max(gramBound, lengthBound), i))
+        bounds.sort()
+        return bounds
+
+    def _search(self, target, bounds, n, maxDistance, skip, best):
+        for bound, i in bounds:
+            limit = best[-1][0] if len(best) == n else maxDistance
+            if limit is not None and bound > limit:
+                break
+            key = self.keys[i]
+            if bound == limit and len(best) == n and key > best[-1][1]:
+                # Could at best tie with the furthest, and would lose the tiebreak.
+                continue
+            if skip is not None and skip(key):
+                continue
+            distance = levenshtein(key, target, limit)
+            if limit is not None and distance > limit:
+                continue
+            entry = (distance, key)
+            if len(best) < n:
+                bisect.insort(best, entry)
+            elif entry < best[-1]:
+                best.pop()
+                bisect.insort(best, entry)
+
+
+def closest(indexes, target, n=5, maxDistance=None, skip=None):
+    # Like NgramIndex.closest(), but across several indexes.
+    results = set()
+    for index in indexes:
+        results.update(index.closest(target, n, maxDistance, skip))
+    return sorted(results)[:n]
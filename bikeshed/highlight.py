@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import re
+import io
+import os
+import sys
+import json
+import errno
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+
+from . import config
+from .htmlhelpers import *
+from .messages import *
+
+'''
+Syntax highlighting, via Pygments.
+
+Code is highlighted into a list of "runs" of text, [css class, text],
+with an empty class for unhighlighted text;
+these are turned straight into <span>s,
+rather than generating HTML and reparsing it.
+
+Highlighting is a pure function of the language and the source text,
+and it's one of the slowest parts of building an example-heavy spec,
+so the runs are cached on disk, in spec-data/cache/highlight/,
+keyed by a hash of the language, the Pygments and lexer versions, and the text.
+The cache can be deleted at any time; it'll just be rebuilt.
+It's also kept to at most maxCacheEntries entries,
+by dropping the least recently used ones whenever a build adds new ones.
+
+Whatever isn't cached is highlighted across a pool of worker processes,
+when there's enough of it to be worth starting one.
+'''
+
+# Bump this whenever the cached output changes for some reason
+# other than the Pygments version or Bikeshed's custom lexers.
+cacheFormat = "2"
+
+# {language => lexer, or None if Pygments doesn't know the language}
+lexerCache = {}
+
+# Worker processes to highlight with; None means one per CPU.
+processes = None
+# Below this many uncached blocks, starting a pool costs more than it saves.
+minParallelBlocks = 20
+# Past this many cached blocks, the least recently used are deleted.
+maxCacheEntries = 20000
+
+def addSyntaxHighlighting(doc):
+    try:
+        from pygments import formatters
+    except ImportError:
+        die("Bikeshed now uses Pygments for syntax highlighting.\nPlease run `$ sudo pip install pygments` from your command line.")
+        return
+
+    highlightingOccurred = False
+
+    # Translate Prism-style highlighting into Pygment-style
+    for el in findAll("[class*=language-], [class*=lang-]", doc):
+        match = re.search("(?:lang|language)-(\w+)", el.get("class"))
+        if match:
+            el.set("highlight", match.group(1))
+
+    # Find all the appropriate elements
+    blocks = []
+    for el in findAll("xmp, pre, code", doc):
+        if list(childElements(el)):
+            # If there's any internal structure, don't override it with highlighting.
+            continue
+        attr, lang = closestAttr(el, "nohighlight", "highlight")
+        if attr == "nohighlight" or attr is None:
+            continue
+        highlightingOccurred = True
+        lang = translateLang(lang)
+        if getLexer(lang) is None:
+            die("'{0}' isn't a known syntax-highlighting language. See http://pygments.org/docs/lexers/. Seen on:\n{1}", lang, outerHTML(el))
+            continue
+        blocks.append((el, lang, textContent(el)))
+
+    # Highlight everything that isn't already in the build cache,
+    # then splice the results back in.
+    uncached = OrderedDict()
+    for _, lang, text in blocks:
+        if not doc.cache.has("highlight", [lang, text]):
+            uncached[lang, text] = True
+    results = highlightAll(list(uncached))
+    for el, lang, text in blocks:
+        runs = doc.cache.cached("highlight", [lang, text], lambda: results[lang, text])
+        replaceContents(el, runsToNodes(runs))
+        # Remove the trailing newline
+        el[-1].tail = el[-1].tail.rstrip()
+        addClass(el, "highlight")
+
+    if highlightingOccurred:
+        doc.extraStyles['style-syntax-highlighting'] += formatters.HtmlFormatter(style=prismStyle()).get_style_defs('.highlight')
+        doc.extraStyles['style-syntax-highlighting'] += """
+        .highlight { background: hsl(24, 20%, 95%); }
+        code.highlight { padding: .1em; border-radius: .3em; }
+        xmp.highlight, pre.highlight, pre > code.highlight { display: block; padding: 1em; margin: .5em 0; overflow: auto; border-radius: 0; }
+        """
+
+
+def translateLang(lang):
+    # Translates some names to ones Pygment understands
+    if lang == "aspnet":
+        return "aspx-cs"
+    if lang in ["markup", "svg"]:
+        return "html"
+    return lang
+
+
+def getLexer(lang):
+    # Lexers are stateless, so one per language is reused for the whole run.
+    if lang not in lexerCache:
+        import pygments.util
+        from pygments.lexers import get_lexer_by_name
+        from . import lexers
+        if lang == "css":
+            lexerCache[lang] = lexers.CSSLexer()
+        else:
+            try:
+                lexerCache[lang] = get_lexer_by_name(lang, encoding="utf-8", stripAll=True)
+            except pygments.util.ClassNotFound:
+                lexerCache[lang] = None
+    return lexerCache[lang]
+
+
+def highlightAll(blocks):
+    # Takes a list of (lang, text),
+    # and returns {(lang, text) => runs}.
+    results = {}
+    misses = []
+    for lang, text in blocks:
+        runs = readCache(cacheKey(text, lang, getLexer(lang)))
+        if runs is None:
+            misses.append((lang, text))
+        else:
+            results[lang, text] = runs
+    for block, runs in zip(misses, mapBlocks(highlightBlock, misses)):
+        results[block] = runs
+    if misses:
+        pruneCache()
+    return results
+
+
+def mapBlocks(fn, blocks):
+    count = processes or multiprocessing.cpu_count()
+    # Daemonic processes (like the workers of `bikeshed batch`) can't start pools of their own.
+    if count <= 1 or len(blocks) < minParallelBlocks or multiprocessing.current_process().daemon:
+        return map(fn, blocks)
+    pool = multiprocessing.Pool(count)
+    try:
+        results = pool.map(fn, blocks, chunksize=max(1, len(blocks) // (count * 4)))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+
+def highlightBlock(block):
+    # Runs in a worker, if there's a pool.
+    lang, text = block
+    lexer = getLexer(lang)
+    runs = spanFormatter().runs(lexer.get_tokens(text))
+    writeCache(cacheKey(text, lang, lexer), runs)
+    return runs
+
+
+def runsToNodes(runs):
+    # Gives the same nodes as parsing HtmlFormatter's output would,
+    # including the empty <span> it starts with.
+    nodes = [E.span()]
+    for cls, text in runs:
+        if cls:
+            span = E.span({"class": cls})
+            span.text = text or None
+            nodes.append(span)
+        else:
+            nodes.append(text)
+    return nodes
+
+
+_spanFormatter = None
+def spanFormatter():
+    global _spanFormatter
+    if _spanFormatter is None:
+        from pygments.formatters import HtmlFormatter
+
+        class SpanFormatter(HtmlFormatter):
+            def runs(self, tokensource):
+                # Mirrors HtmlFormatter._format_lines(), but produces runs rather than HTML:
+                # spans never cross a line break,
+                # and adjacent tokens with the same class on a line are merged.
+                runs = []
+                lineHasContent = False
+                lastClass = None
+                for ttype, value in tokensource:
+                    cls = self._get_css_classes(ttype)
+                    parts = value.split("\n")
+                    for part in parts[:-1]:
+                        if lineHasContent:
+                            if lastClass != cls:
+                                runs.append([cls, part])
+                            else:
+                                runs[-1][1] += part
+                        elif part:
+                            runs.append([cls, part])
+                        runs.append(["", "\n"])
+                        lineHasContent = False
+                    if parts[-1]:
+                        if lineHasContent and lastClass == cls:
+                            runs[-1][1] += parts[-1]
+                        else:
+                            runs.append([cls, parts[-1]])
+                        lastClass = cls
+                        lineHasContent = True
+                if lineHasContent:
+                    runs.append(["", "\n"])
+                return runs
+        _spanFormatter = SpanFormatter()
+    return _spanFormatter
+
+
+def cacheKey(text, lang, lexer):
+    import pygments
+    hash = hashlib.sha1()
+    for part in [cacheFormat, pygments.__version__, lexerVersion(lexer), lang, text]:
+        hash.update(part.encode("utf-8"))
+        hash.update(b"\0")
+    return hash.hexdigest()
+
+
+lexerVersions = {}
+def lexerVersion(lexer):
+    # Bikeshed's own lexers change independently of Pygments,
+    # so they're versioned by the hash of their source.
+    module = lexer.__class__.__module__
+    if module not in lexerVersions:
+        if module.startswith("pygments."):
+            lexerVersions[module] = ""
+        else:
+            filename = os.path.splitext(sys.modules[module].__file__)[0] + ".py"
+            try:
+                with io.open(filename, "rb") as fh:
+                    lexerVersions[module] = hashlib.sha1(fh.read()).hexdigest()
+            except IOError:
+                lexerVersions[module] = ""
+    return lexerVersions[module]
+
+
+def cachePath(key):
+    return os.path.join(config.scriptPath, "spec-data", "cache", "highlight", key[:2], key[2:] + ".json")
+
+
+def readCache(key):
+    path = cachePath(key)
+    try:
+        with io.open(path, "r", encoding="utf-8") as fh:
+            runs = json.load(fh)
+    except (IOError, ValueError):
+        return None
+    # Mark it as recently used, for pruneCache().
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return runs
+
+
+def writeCache(key, runs):
+    # The cache is only an optimization,
+    # so failing to write it (read-only install, etc) isn't an error.
+    path = cachePath(key)
+    try:
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Write then rename, so concurrent builds never see a partial file.
+        tempPath = "{0}.{1}.tmp".format(path, os.getpid())
+        with io.open(tempPath, "w", encoding="utf-8") as fh:
+            fh.write(unicode(json.dumps(runs, ensure_ascii=False)))
+        os.rename(tempPath, path)
+    except (IOError, OSError):
+        pass
+
+
+def pruneCache():
+    # Deletes the least recently used entries, if there are more than maxCacheEntries.
+    root = os.path.join(config.scriptPath, "spec-data", "cache", "highlight")
+    entries = []
+    try:
+        for dir in os.listdir(root):
+            for name in os.listdir(os.path.join(root, dir)):
+                path = os.path.join(root, dir, name)
+                entries.append((os.stat(path).st_mtime, path))
+    except OSError:
+        return
+    if len(entries) <= maxCacheEntries:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - maxCacheEntries]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def prismStyle():
+    from pygments import token
+    from pygments import style
+
+    class PrismStyle(style.Style):
+        default_style = "#000000"
+        styles = {
+            token.Name: "#0077aa",
+            token.Name.Tag: "#669900",
+            token.Name.Builtin: "noinherit",
+            token.Name.Other: "noinherit",
+            token.Operator: "#999999",
+            token.Punctuation: "#999999",
+            token.Keyword: "#990055",
+            token.Literal: "#000000",
+            token.Literal.Number: "#000000",
+            token.Literal.String: "#a67f59",
+            token.Comment: "#708090"
+        }
+    return PrismStyle
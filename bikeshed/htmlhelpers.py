@@ -18,11 +18,26 @@ unescapeParser = HTMLParser.HTMLParser()
 def unescape(string):
     return unescapeParser.unescape(string)
 
+# Compiling a selector to XPath costs about as much as running it,
+# and most selectors are run many times per build, so they're compiled once.
+# (Capped, since some callers generate one-off selectors, like #some-id.)
+compiledSelectors = {}
+maxCompiledSelectors = 1000
+
+def compileSelector(sel):
+    selector = compiledSelectors.get(sel)
+    if selector is None:
+        if len(compiledSelectors) >= maxCompiledSelectors:
+            compiledSelectors.clear()
+        selector = CSSSelector(sel, namespaces={"svg":"http://www.w3.org/2000/svg"})
+        compiledSelectors[sel] = selector
+    return selector
+
 def findAll(sel, context):
     if isinstance(context, config.specClass):
         context = context.document
     try:
-        return CSSSelector(sel, namespaces={"svg":"http://www.w3.org/2000/svg"})(context)
+        return compileSelector(sel)(context)
     except Exception, e:
         die("The selector '{0}' returned an error:\n{1}", sel, e)
         return []
@@ -459,30 +474,66 @@ def translateIDs(trans, els):
             el.set('id', trans[el.get('id')][0])
 
 def dedupIDs(doc):
-    import itertools as iter
-    def findId(id):
-        return find("#"+id, doc) is not None
-    ids = Counter(el.get('id') for el in findAll("[id]", doc))
-    dupes = [id for id,count in ids.items() if count > 1]
-    for dupe in dupes:
+    ids = IDRegistry(doc)
+    for dupe in ids.duplicates():
         warnAboutDupes = True
         if re.match(r"issue-[0-9a-fA-F]{8}$", dupe):
             # Don't warn about issues, it's okay if they have the same ID because they're identical text.
             warnAboutDupes = False
-        els = findAll("#"+dupe, doc)
-        ints = iter.imap(str, iter.count(0))
-        for el in els[1:]:
+        for el in ids.all(dupe)[1:]:
             # If I registered an alternate ID, try to use that.
             if el.get('data-alternate-id'):
-                el.set("id", el.get("data-alternate-id"))
+                ids.setID(el, el.get("data-alternate-id"))
                 continue
             # Try to de-dup the id by appending an integer after it.
             if warnAboutDupes:
                 warn("Multiple elements have the same ID '{0}'.\nDeduping, but this ID may not be stable across revisions.", dupe)
-            for x in ints:
-                if not findId(dupe+x):
-                    el.set("id", dupe+x)
-                    break
+            ids.setID(el, ids.uniqueID(dupe))
+
+class IDRegistry(object):
+    '''
+    Index of every ID in a document, from a single scan of the tree,
+    so ID lookups and picking fresh unique IDs don't each need a selector query.
+
+    It only sees changes made through setID(),
+    so build a fresh one for each pass rather than holding onto it.
+    '''
+    def __init__(self, doc):
+        # {id => [elements with that id, in document order]}
+        self.ids = {}
+        for el in findAll("[id]", doc):
+            self.ids.setdefault(el.get('id'), []).append(el)
+        # {base id => next integer suffix to try}, for uniqueID()
+        self.suffixes = {}
+
+    def __contains__(self, id):
+        return bool(self.ids.get(id))
+
+    def get(self, id):
+        # The first element with the given ID, or None.
+        els = self.ids.get(id)
+        return els[0] if els else None
+
+    def all(self, id):
+        return list(self.ids.get(id, []))
+
+    def duplicates(self):
+        return [id for id,els in self.ids.items() if len(els) > 1]
+
+    def setID(self, el, id):
+        oldID = el.get('id')
+        if oldID is not None and el in self.ids.get(oldID, []):
+            self.ids[oldID].remove(el)
+        el.set('id', id)
+        self.ids.setdefault(id, []).append(el)
+
+    def uniqueID(self, base):
+        # Returns the first of base0, base1, base2... that isn't in use yet.
+        i = self.suffixes.get(base, 0)
+        while base+str(i) in self:
+            i += 1
+        self.suffixes[base] = i + 1
+        return base+str(i)
 
 def createElement(tag, attrs={}, *children):
     el = etree.Element(tag, {n:v for n,v in attrs.items() if v is not None})
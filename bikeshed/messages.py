@@ -8,6 +8,9 @@ import config
 
 messages = set()
 messageCounts = Counter()
+# Like messageCounts, but also counts the repeats that get deduped,
+# and is never reset, so callers can tell if some bit of work emitted anything at all.
+emittedCounts = Counter()
 
 def p(msg):
     if config.quiet == float("infinity"):
@@ -24,6 +27,7 @@ def p(msg):
 
 def die(msg, *formatArgs, **namedArgs):
     msg = formatMessage("fatal", msg.format(*formatArgs, **namedArgs))
+    emittedCounts["fatal"] += 1
     if msg not in messages:
         messageCounts["fatal"] += 1
         messages.add(msg)
@@ -35,6 +39,7 @@ def die(msg, *formatArgs, **namedArgs):
 
 def linkerror(msg, *formatArgs, **namedArgs):
     msg = formatMessage("link", msg.format(*formatArgs, **namedArgs))
+    emittedCounts["linkerror"] += 1
     if msg not in messages:
         messageCounts["linkerror"] += 1
         messages.add(msg)
@@ -43,6 +48,7 @@ def linkerror(msg, *formatArgs, **namedArgs):
 
 def warn(msg, *formatArgs, **namedArgs):
     msg = formatMessage("warning", msg.format(*formatArgs, **namedArgs))
+    emittedCounts["warning"] += 1
     if msg not in messages:
         messageCounts["warning"] += 1
         messages.add(msg)
@@ -64,10 +70,9 @@ def failure(msg, *formatArgs, **namedArgs):
         p(msg)
 
 def resetSeenMessages():
-    global messages
-    messages = set()
-    global messageCounts
-    messageCounts = Counter()
+    # Cleared in place, since other modules hold references to these via import *.
+    messages.clear()
+    messageCounts.clear()
 
 def printColor(text, color="white", *styles):
     if config.printMode == "plain":
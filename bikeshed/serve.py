@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import os
+import time
+import urllib
+import urlparse
+import BaseHTTPServer
+
+from .messages import *
+from .ReferenceManager import ReferenceManager
+
+'''
+A long-running build server.
+
+The global reference data (anchors, specs, methods, biblio keys...)
+is loaded once, into a base ReferenceManager that's never modified.
+Each build gets a cheap overlay of it (see ReferenceManager.overlay())
+to hold the spec's own dfns and anchors,
+so a rebuild only pays for the spec itself.
+
+GET /path/to/spec.bs builds that file (relative to the served directory)
+and responds with the rendered HTML.
+'''
+
+def serve(constructor, port=8000, host="localhost", root="."):
+    root = os.path.abspath(root)
+    say("Loading reference data...")
+    baseRefs = ReferenceManager()
+    baseRefs.loadGlobalData()
+
+    class SpecHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = urllib.unquote(urlparse.urlparse(self.path).path).decode("utf-8")
+            filename = os.path.abspath(os.path.join(root, path.lstrip("/")))
+            if not filename.startswith(root + os.sep) or not os.path.isfile(filename):
+                self.respond(404, "No spec source file at '{0}'.".format(path))
+                return
+            try:
+                rendered = build(constructor, baseRefs, filename)
+            except Exception, e:
+                self.respond(500, "Something went wrong while building '{0}':\n{1}".format(path, e))
+                return
+            if rendered is None:
+                self.respond(500, "Couldn't build '{0}'.".format(path))
+                return
+            self.respond(200, rendered, contentType="text/html")
+
+        def respond(self, code, text, contentType="text/plain"):
+            body = text.encode("utf-8")
+            self.send_response(code)
+            self.send_header(str("Content-Type"), str("{0}; charset=utf-8".format(contentType)))
+            self.send_header(str("Content-Length"), str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            say("{0} - {1}", self.address_string(), format % args)
+
+    server = BaseHTTPServer.HTTPServer((host, port), SpecHandler)
+    say("Serving specs from {0} at http://{1}:{2}/", root, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def build(constructor, baseRefs, filename):
+    # Builds the spec in its own directory, so relative includes and local data files work.
+    resetSeenMessages()
+    start = time.time()
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(filename))
+    try:
+        doc = constructor(inputFilename=os.path.basename(filename), baseRefs=baseRefs)
+        if not doc.valid:
+            return None
+        doc.preprocess()
+        doc.printResultMessage()
+        rendered = doc.serialize()
+    finally:
+        os.chdir(cwd)
+    say("Built {0} in {1:.2f}s.", filename, time.time() - start)
+    return rendered
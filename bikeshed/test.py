@@ -63,3 +63,22 @@ def rebase(files=None):
 	for file in files:
 		p("Rebasing {0}".format(file))
 		subprocess.call("bikeshed -qf spec {0}".format(pipes.quote(file)), shell=True)
+
+def benchSerializer(constructor, count=5, repeat=10):
+	# Times serialization alone, on the tests with the largest outputs.
+	import os
+	import time
+	testFolder = config.scriptPath + "/../tests/"
+	testnames = sorted(glob.glob(testFolder + "*.bs"), key=lambda name: os.path.getsize(name[:-2] + "html"), reverse=True)[:count]
+	total = 0
+	for testname in testnames:
+		doc = constructor(inputFilename=testname)
+		doc.preprocess()
+		best = float("inf")
+		for _ in range(repeat):
+			start = time.time()
+			doc.serializeTo(lambda chunk: None)
+			best = min(best, time.time() - start)
+		total += best
+		p("{0:<30} {1:>8.2f}ms".format(os.path.basename(testname), best * 1000))
+	p("{0:<30} {1:>8.2f}ms".format("Total", total * 1000))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import sys
+import time
+import json
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; memory just won't be reported.
+    resource = None
+
+class Timings(object):
+    '''
+    Records the wall time and peak memory of each stage of a build,
+    when enabled (with --timings or --timings-json).
+
+    Stages are run through run(), which just calls straight through when disabled.
+    Peak memory is the process's max RSS after the stage finished,
+    so the stage that pushed it up is the one whose "+" column is non-zero.
+    '''
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        # [(stage name, seconds, max rss in KB after the stage or None)]
+        self.stages = []
+
+    def run(self, fn, *args, **kwargs):
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        start = time.time()
+        ret = fn(*args, **kwargs)
+        self.stages.append((stageName(fn), time.time() - start, maxRss()))
+        return ret
+
+    def total(self):
+        return sum(seconds for _, seconds, _ in self.stages)
+
+    def table(self):
+        nameWidth = max([len(name) for name, _, _ in self.stages] + [len("Stage")])
+        lines = ["{0:<{w}}  {1:>9}  {2:>6}  {3:>10}  {4:>8}".format("Stage", "Time (ms)", "%", "Peak (MB)", "+ (MB)", w=nameWidth)]
+        total = self.total() or 1
+        lastRss = None
+        for name, seconds, rss in self.stages:
+            if rss is None:
+                peak = grew = "-"
+            else:
+                peak = "{0:.1f}".format(rss / 1024)
+                grew = "{0:.1f}".format((rss - lastRss) / 1024) if lastRss is not None else "-"
+                lastRss = rss
+            lines.append("{0:<{w}}  {1:>9.1f}  {2:>6.1f}  {3:>10}  {4:>8}".format(name, seconds * 1000, seconds / total * 100, peak, grew, w=nameWidth))
+        lines.append("{0:<{w}}  {1:>9.1f}".format("Total", self.total() * 1000, w=nameWidth))
+        return "\n".join(lines)
+
+    def json(self):
+        return unicode(json.dumps({
+            "total": self.total(),
+            "stages": [{"stage": name, "seconds": seconds, "maxRssKB": rss} for name, seconds, rss in self.stages]
+        }, indent=2))
+
+
+def stageName(fn):
+    # "boilerplate.addIndexSection", "ReferenceManager.initializeRefs", "processAutolinks"
+    if getattr(fn, "__self__", None) is not None:
+        return "{0}.{1}".format(fn.__self__.__class__.__name__, fn.__name__)
+    module = fn.__module__.rpartition(".")[2]
+    if module == "bikeshed":
+        return fn.__name__
+    return "{0}.{1}".format(module, fn.__name__)
+
+
+def maxRss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on Mac, and KB everywhere else.
+    if sys.platform == "darwin":
+        rss //= 1024
+    return rss
@@ -3,301 +3,599 @@ from __future__ import division, unicode_literals
 import json
 import re
 import io
+import os
+import hashlib
+import filecmp
+import shutil
 from collections import defaultdict
-from contextlib import closing
-import urllib2
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
 from . import config
 from . import biblio
 from DefaultOrderedDict import DefaultOrderedDict
+from .fetcher import Fetcher, atomicWrite
 from .messages import *
+from .ReferenceManager import writeAnchorIndex
 
 from .apiclient.apiclient import apiclient
 
-def update(anchors=False, biblio=False, linkDefaults=False, testSuites=False):
+shepherdURL = "https://api.csswg.org/shepherd/"
+shepherdVersion = "vnd.csswg.shepherd.v1"
+specrefURL = "https://specref.herokuapp.com/bibrefs"
+csswgBiblioURL = "https://raw.githubusercontent.com/w3c/csswg-drafts/master/biblio.ref"
+linkDefaultsURL = "https://raw.githubusercontent.com/tabatkins/bikeshed/master/bikeshed/spec-data/readonly/link-defaults.infotree"
+
+def update(anchors=False, biblio=False, linkDefaults=False, testSuites=False, fetcher=None):
+    '''
+    All the downloads are started at once, through the fetcher
+    (at most fetcher.maxConnections at a time),
+    and each kind of data is processed and written as soon as its own downloads are done.
+    Pass a Fetcher with a different opener to swap out the HTTP layer.
+
+    Downloads are conditional on what was last downloaded,
+    so data that hasn't changed isn't downloaded or processed again.
+    '''
+    if fetcher is None:
+        fetcher = Fetcher()
+    state = UpdateState()
     # If all are False, update everything
     updateAnyway = not (anchors or biblio or linkDefaults or testSuites)
+    updates = []
     if anchors or updateAnyway:
-        updateCrossRefs()
+        # http://api.csswg.org/shepherd/spec/?spec=css-flexbox-1&anchors&draft, for manual looking
+        updates.append(("anchor data", partial(updateCrossRefs, state), [Download(shepherdGet, fetcher, "specifications", state.validators("anchor data"), stream=True, anchors=True, draft=True)]))
     if biblio or updateAnyway:
-        updateBiblio()
+        updates.append(("biblio data", partial(updateBiblio, state), [Download(fetcher.fetch, specrefURL), Download(fetcher.fetch, csswgBiblioURL)]))
     if linkDefaults or updateAnyway:
-        updateLinkDefaults()
+        updates.append(("link defaults", partial(updateLinkDefaults, state), [Download(fetcher.fetch, linkDefaultsURL)]))
     if testSuites or updateAnyway:
-        updateTestSuites()
+        updates.append(("test suite data", partial(updateTestSuites, state), [Download(shepherdGet, fetcher, "test_suites", state.validators("test suite data"))]))
+    say("Downloading {0}...", ", ".join(name for name, _, _ in updates))
+    runUpdates(updates, fetcher.maxConnections)
+
+
+class Download(object):
+    '''
+    A download to run on a worker thread.
+    result() returns what it got, or re-raises what it failed with,
+    so the update using it can handle failures where it always has.
+    '''
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.error = None
 
-def updateCrossRefs():
+    def run(self):
+        try:
+            self.value = self.fn(*self.args, **self.kwargs)
+        except Exception, e:
+            self.error = e
+        return self
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def runUpdates(updates, maxConnections):
+    # Takes a list of (name, update function, [Download]).
+    # The downloads run concurrently; each update function is called (on this thread)
+    # with its Downloads as soon as they've all finished.
+    jobs = [(i, download) for i, (_, _, downloads) in enumerate(updates) for download in downloads]
+    if not jobs:
+        return
+    remaining = [len(downloads) for _, _, downloads in updates]
+    pool = ThreadPool(min(maxConnections, len(jobs)))
     try:
-        say("Downloading anchor data...")
-        shepherd = apiclient.APIClient("https://api.csswg.org/shepherd/", version = "vnd.csswg.shepherd.v1")
-        res = shepherd.get("specifications", anchors = True, draft = True)
-        # http://api.csswg.org/shepherd/spec/?spec=css-flexbox-1&anchors&draft, for manual looking
-        if ((not res) or (406 == res.status)):
-            die("This version of the anchor-data API is no longer supported. Please update Bikeshed.")
-            return
-        if res.contentType not in config.anchorDataContentTypes:
-            die("Unrecognized anchor-data content-type '{0}'.", res.contentType)
+        for i, _ in pool.imap_unordered(runDownload, jobs):
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                name, fn, downloads = updates[i]
+                say("Updating {0}...", name)
+                fn(*downloads)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def runDownload(job):
+    i, download = job
+    return i, download.run()
+
+
+def shepherdGet(fetcher, name, validators=None, **kwargs):
+    # validators are the [[etag, last modified]] recorded for the previous response, if any.
+    etag, lastModified = validators[0] if validators else (None, None)
+    shepherd = apiclient.APIClient(shepherdURL, version=shepherdVersion, opener=fetcher.opener)
+    return shepherd.getIfChanged(name, etag=etag, lastModified=lastModified, **kwargs)
+
+
+class UpdateState(object):
+    '''
+    Remembers the validators (ETag and Last-Modified) of the responses
+    each kind of data was last written from,
+    so that if none of them have changed, the update can be skipped.
+    It's thrown away whenever the data files are replaced by fixupDataFiles().
+    '''
+    def __init__(self):
+        self.path = os.path.join(config.scriptPath, "spec-data", "cache", "update.json")
+        try:
+            with io.open(self.path, 'r', encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (IOError, ValueError):
+            self.data = {}
+
+    def validators(self, name):
+        return self.data.get(name)
+
+    def unchanged(self, name, responses):
+        # For Fetcher responses, which come from its cache when the server says they haven't changed.
+        return all(r.fromCache for r in responses) and self.data.get(name) == validatorsOf(responses)
+
+    def record(self, name, responses):
+        self.data[name] = validatorsOf(responses)
+        try:
+            atomicWrite(self.path, json.dumps(self.data, indent=2, sort_keys=True).encode("utf-8"))
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        self.data = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def validatorsOf(responses):
+    return [[r.etag, r.lastModified] for r in responses]
+
+
+def writeDataFile(path, text):
+    # Writes the text to the file, unless it already has exactly that content,
+    # so unchanged files keep their mtimes (and the indexes built from them stay valid).
+    # Returns whether the file was written.
+    data = unicode(text).encode("utf-8")
+    try:
+        with io.open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except IOError:
+        pass
+    # Written to a temp file and moved into place, so a build reading the file meanwhile
+    # (like biblio.data, which is read piecemeal throughout a build)
+    # sees either the old data or the new, never a mix.
+    tempPath = "{0}.{1}.tmp".format(path, os.getpid())
+    try:
+        with io.open(tempPath, 'wb') as f:
+            f.write(data)
+        moveDataFile(tempPath, path)
+    finally:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+    return True
+
+
+def replaceDataFile(tempPath, path):
+    # Like writeDataFile(), but for data that's already been written out to tempPath,
+    # which is moved into place (or just removed, if it's the same).
+    if os.path.exists(path) and filecmp.cmp(tempPath, path, shallow=False):
+        os.remove(tempPath)
+        return False
+    moveDataFile(tempPath, path)
+    return True
+
+
+def moveDataFile(tempPath, path):
+    try:
+        os.rename(tempPath, path)
+    except OSError:
+        # Windows won't rename over an existing file.
+        os.remove(path)
+        os.rename(tempPath, path)
+
+
+def updateCrossRefs(state, download):
+    res = None
+    try:
+        try:
+            res = download.result()
+            if res and res.notModified:
+                say("Anchor data is already up to date.")
+                return
+            if ((not res) or (406 == res.status)):
+                die("This version of the anchor-data API is no longer supported. Please update Bikeshed.")
+                return
+            if res.contentType not in config.anchorDataContentTypes:
+                die("Unrecognized anchor-data content-type '{0}'.", res.contentType)
+                return
+        except Exception, e:
+            die("Couldn't download anchor data.  Error was:\n{0}", str(e))
             return
-        rawSpecData = res.data
-    except Exception, e:
-        die("Couldn't download anchor data.  Error was:\n{0}", str(e))
-        return
+        updated = processCrossRefs(res.stream)
+    finally:
+        # The response is streamed, so its connection stays open until it's closed.
+        if res:
+            res.close()
+    if updated:
+        if not config.dryRun:
+            state.record("anchor data", [res])
+        say("Success!")
 
-    def linearizeAnchorTree(multiTree, list=None):
-        if list is None:
-            list = []
-        # Call with multiTree being a list of trees
-        for item in multiTree:
-            if item['type'] in config.dfnTypes.union(["dfn", "heading"]):
-                list.append(item)
-            if item.get('children'):
-                linearizeAnchorTree(item['children'], list)
-        return list
 
+def processCrossRefs(stream):
+    # The anchor data is by far the biggest download,
+    # so rather than holding it all in memory, it's processed one spec at a time as it streams in:
+    # each spec's headings and anchors are written out straight away.
+    # They're written into a temp directory, and only moved into place
+    # once the whole dump has been read, so a failed update leaves the old data alone.
+    # Returns whether it was successful.
+    dataPath = config.scriptPath+"/spec-data/"
+    tempPath = dataPath+"anchors-update.tmp/"
     specs = dict()
-    anchors = defaultdict(list)
-    headings = defaultdict(dict)
-    for rawSpec in rawSpecData.values():
-        spec = {
-            'vshortname': rawSpec['name'],
-            'shortname': rawSpec.get('short_name'),
-            'TR': rawSpec.get('base_uri'),
-            'ED': rawSpec.get('draft_uri'),
-            'title': rawSpec.get('title'),
-            'description': rawSpec.get('description')
-        }
-        if spec['shortname'] is not None and spec['vshortname'].startswith(spec['shortname']):
-            # S = "foo", V = "foo-3"
-            # Strip the prefix
-            level = spec['vshortname'][len(spec['shortname']):]
-            if level.startswith("-"):
-                level = level[1:]
-            if level.isdigit():
-                spec['level'] = int(level)
-            else:
-                spec['level'] = 1
-        elif spec['shortname'] is None and re.match(r"(.*)-(\d+)", spec['vshortname']):
-            # S = None, V = "foo-3"
-            match = re.match(r"(.*)-(\d+)", spec['vshortname'])
-            spec['shortname'] = match.group(1)
-            spec['level'] = int(match.group(2))
-        else:
-            spec['shortname'] = spec['vshortname']
-            spec['level'] = 1
-        specs[spec['vshortname']] = spec
-        specHeadings = headings[spec['vshortname']]
-
-        def setStatus(status):
-            def temp(obj):
-                obj['status'] = status
-                return obj
-            return temp
-        rawAnchorData = map(setStatus('TR'), linearizeAnchorTree(rawSpec.get('anchors', []))) + map(setStatus('ED'), linearizeAnchorTree(rawSpec.get('draft_anchors',[])))
-        for rawAnchor in rawAnchorData:
-            rawAnchor = fixupAnchor(rawAnchor)
-            linkingTexts = rawAnchor.get('linking_text', [rawAnchor.get('title')])
-            if linkingTexts[0] is None:
-                continue
-            if rawAnchor['type'] == "heading":
-                uri = rawAnchor['uri']
-                if uri.startswith("??"):
-                    # css3-tables has this a bunch, for some strange reason
-                    uri = uri[2:]
-                if uri[0] == "#":
-                    # Either single-page spec, or link on the top page of a multi-page spec
-                    heading = {
-                        'url': spec[rawAnchor['status']] + uri,
-                        'number': rawAnchor['name'] if re.match(r"[\d.]+$", rawAnchor['name']) else "",
-                        'text': rawAnchor['title'],
-                        'spec': spec['title']
-                    }
-                    fragment = uri
-                    shorthand = "/"+fragment
-                else:
-                    # Multi-page spec, need to guard against colliding IDs
-                    if "#" in uri:
-                        # url to a heading in the page, like "foo.html#bar"
-                        match = re.match(r"([\w-]+).*?(#.*)", uri)
-                        if not match:
-                            die("Unexpected URI pattern '{0}' for spec '{1}'. Please report this to the Bikeshed maintainer.", uri, spec['vshortname'])
-                            continue
-                        page, fragment = match.groups()
-                        page = "/"+page
-                    else:
-                        # url to a page itself, like "foo.html"
-                        page, _, _ = uri.partition(".")
-                        page = "/"+page
-                        fragment = "#"
-                    shorthand = page + fragment
-                    heading = {
-                        'url': spec[rawAnchor['status']] + uri,
-                        'number': rawAnchor['name'] if re.match(r"[\d.]+$", rawAnchor['name']) else "",
-                        'text': rawAnchor['title'],
-                        'spec': spec['title']
-                    }
-                if shorthand not in specHeadings:
-                    specHeadings[shorthand] = {}
-                specHeadings[shorthand][rawAnchor['status']] = heading
-                if fragment not in specHeadings:
-                    specHeadings[fragment] = []
-                if shorthand not in specHeadings[fragment]:
-                    specHeadings[fragment].append(shorthand)
-            else:
-                anchor = {
-                    'status': rawAnchor['status'],
-                    'type': rawAnchor['type'],
-                    'spec': spec['vshortname'],
-                    'shortname': spec['shortname'],
-                    'level': int(spec['level']),
-                    'export': rawAnchor.get('export', False),
-                    'normative': rawAnchor.get('normative', False),
-                    'url': spec[rawAnchor['status']] + rawAnchor['uri'],
-                    'for': rawAnchor.get('for', [])
-                }
-                for text in linkingTexts:
-                    if anchor['type'] in config.lowercaseTypes:
-                        text = text.lower()
-                    text = re.sub(r'\s+', ' ', text)
-                    anchors[text].append(anchor)
-
-    # Headings data was purposely verbose, assuming collisions even when there wasn't one.
-    # Want to keep the collision data for multi-page, so I can tell when you request a non-existent page,
-    # but need to collapse away the collision stuff for single-page.
-    for specHeadings in headings.values():
-        for k, v in specHeadings.items():
-            if k[0] == "#" and len(v) == 1 and v[0][0:2] == "/#":
-                # No collision, and this is either a single-page spec or a non-colliding front-page link
-                # Go ahead and collapse them.
-                specHeadings[k] = specHeadings[v[0]]
-                del specHeadings[v[0]]
-
-    # Compile a db of {argless methods => {argfull method => {args, fors, url, shortname}}
+    # {argless methods => {argfull method => {args, fors, shortname}}
     methods = defaultdict(dict)
-    for key, anchors_ in anchors.items():
-        # Extract the name and arguments
-        match = re.match(r"([^(]+)\((.*)\)", key)
-        if not match:
-            continue
-        methodName, argstring = match.groups()
-        arglessMethod = methodName + "()"
-        args = [x.strip() for x in argstring.split(",")] if argstring else []
-        for anchor in anchors_:
-            if anchor['type'] not in config.idlMethodTypes:
-                continue
-            if key not in methods[arglessMethod]:
-                methods[arglessMethod][key] = {"args":args, "for": set(), "shortname":anchor['shortname']}
-            methods[arglessMethod][key]["for"].update(anchor["for"])
-    # Translate the "for" set back to a list for JSONing
-    for signatures in methods.values():
-        for signature in signatures.values():
-            signature["for"] = list(signature["for"])
-
-    # Compile a db of {for value => dict terms that use that for value}
+    # {for value => dict terms that use that for value}
     fors = defaultdict(set)
-    for key, anchors_ in anchors.items():
-        for anchor in anchors_:
-            for for_ in anchor["for"]:
-                if for_ == "":
-                    continue
-                fors[for_].add(key)
-            if not anchor["for"]:
-                fors["/"].add(key)
-    for key, val in fors.items():
-        fors[key] = list(val)
+    changedSpecs = set()
+    anchorsFile = None
+    try:
+        try:
+            if not config.dryRun:
+                shutil.rmtree(tempPath, ignore_errors=True)
+                os.makedirs(tempPath+"headings")
+                anchorsFile = io.open(tempPath+"anchors.data", 'w', encoding="utf-8")
+            for _, rawSpec in stream.items():
+                spec, specAnchors, specHeadings, changed = loadSpec(rawSpec)
+                specs[spec['vshortname']] = spec
+                if changed:
+                    changedSpecs.add(spec['vshortname'])
+                addMethods(methods, specAnchors)
+                addFors(fors, specAnchors)
+                if anchorsFile:
+                    # Headings are sharded per spec, as most documents only ever link into a few specs' sections.
+                    with io.open(tempPath+"headings/headings-{0}.json".format(spec['vshortname']), 'w', encoding="utf-8") as f:
+                        f.write(unicode(json.dumps(specHeadings, ensure_ascii=False, indent=2, sort_keys=True)))
+                    writeAnchorsFile(anchorsFile, specAnchors)
+            if anchorsFile:
+                anchorsFile.close()
+        except Exception, e:
+            die("Couldn't process anchor data.  Error was:\n{0}", str(e))
+            return False
+        say("{0} of {1} specs changed.", len(changedSpecs), len(specs))
+        if config.dryRun:
+            return True
+
+        # Translate the "for" sets back to lists for JSONing
+        for signatures in methods.values():
+            for signature in signatures.values():
+                signature["for"] = sorted(signature["for"])
+        for key, val in fors.items():
+            fors[key] = sorted(val)
 
-    if not config.dryRun:
         try:
-            with io.open(config.scriptPath+"/spec-data/specs.json", 'w', encoding="utf-8") as f:
-                f.write(unicode(json.dumps(specs, ensure_ascii=False, indent=2, sort_keys=True)))
+            writeDataFile(dataPath+"specs.json", json.dumps(specs, ensure_ascii=False, indent=2, sort_keys=True))
         except Exception, e:
             die("Couldn't save spec database to disk.\n{0}", e)
-            return
+            return False
         try:
-            with io.open(config.scriptPath+"/spec-data/headings.json", 'w', encoding="utf-8") as f:
-                f.write(unicode(json.dumps(headings, ensure_ascii=False, indent=2, sort_keys=True)))
+            replaceHeadings(tempPath+"headings/", dataPath+"headings/")
         except Exception, e:
             die("Couldn't save headings database to disk.\n{0}", e)
-            return
+            return False
         try:
-            with io.open(config.scriptPath+"/spec-data/anchors.data", 'w', encoding="utf-8") as f:
-                writeAnchorsFile(f, anchors)
+            anchorsChanged = replaceDataFile(tempPath+"anchors.data", dataPath+"anchors.data")
         except Exception, e:
             die("Couldn't save anchor database to disk.\n{0}", e)
-            return
+            return False
         try:
-            with io.open(config.scriptPath+"/spec-data/methods.json", 'w', encoding="utf-8") as f:
-                f.write(unicode(json.dumps(methods, ensure_ascii=False, indent=2, sort_keys=True)))
+            # An unchanged anchors.data keeps its mtime, so its index is still good.
+            if anchorsChanged or not os.path.exists(dataPath+"anchors.index"):
+                writeAnchorIndex(dataPath+"anchors.data", dataPath+"anchors.index")
+        except Exception, e:
+            die("Couldn't save anchor index to disk.\n{0}", e)
+            return False
+        try:
+            writeDataFile(dataPath+"methods.json", json.dumps(methods, ensure_ascii=False, indent=2, sort_keys=True))
         except Exception, e:
             die("Couldn't save methods database to disk.\n{0}", e)
-            return
+            return False
         try:
-            with io.open(config.scriptPath+"/spec-data/fors.json", 'w', encoding="utf-8") as f:
-                f.write(unicode(json.dumps(fors, ensure_ascii=False, indent=2, sort_keys=True)))
+            writeDataFile(dataPath+"fors.json", json.dumps(fors, ensure_ascii=False, indent=2, sort_keys=True))
         except Exception, e:
             die("Couldn't save fors database to disk.\n{0}", e)
-            return
+            return False
+        pruneSpecCache(specs)
+        return True
+    finally:
+        # Also reached if a die() exits partway through.
+        if anchorsFile:
+            anchorsFile.close()
+        if not config.dryRun:
+            shutil.rmtree(tempPath, ignore_errors=True)
 
-    say("Success!")
+
+def replaceHeadings(tempDir, dir):
+    # Moves the new headings shards into place (leaving unchanged ones alone),
+    # and deletes the shards of specs that are no longer in the anchor data.
+    if not os.path.isdir(dir):
+        os.makedirs(dir)
+    names = set(os.listdir(tempDir))
+    for name in names:
+        replaceDataFile(tempDir+name, dir+name)
+    for name in os.listdir(dir):
+        if name not in names and name.startswith("headings-"):
+            os.remove(dir+name)
+
+
+def addMethods(methods, anchors):
+    for key, anchor in anchors:
+        if anchor['type'] not in config.idlMethodTypes:
+            continue
+        # Extract the name and arguments
+        match = re.match(r"([^(]+)\((.*)\)", key)
+        if not match:
+            continue
+        methodName, argstring = match.groups()
+        arglessMethod = methodName + "()"
+        args = [x.strip() for x in argstring.split(",")] if argstring else []
+        if key not in methods[arglessMethod]:
+            methods[arglessMethod][key] = {"args":args, "for": set(), "shortname":anchor['shortname']}
+        methods[arglessMethod][key]["for"].update(anchor["for"])
+
+
+def addFors(fors, anchors):
+    for key, anchor in anchors:
+        for for_ in anchor["for"]:
+            if for_ == "":
+                continue
+            fors[for_].add(key)
+        if not anchor["for"]:
+            fors["/"].add(key)
+
+
+# Bump this whenever processSpec()'s output changes,
+# so specs processed by older versions get reprocessed.
+specCacheFormat = "1"
+
+def loadSpec(rawSpec):
+    # Returns processSpec()'s results plus whether the spec changed since the last update.
+    # Each spec's results are cached under the hash of its raw data,
+    # so only specs that changed need to be processed again.
+    hash = hashlib.sha1(specCacheFormat.encode("utf-8"))
+    hash.update(json.dumps(rawSpec, sort_keys=True).encode("utf-8"))
+    hash = hash.hexdigest()
+    path = os.path.join(specCacheDir(), rawSpec['name'] + ".json")
+    try:
+        with io.open(path, 'r', encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached['hash'] == hash:
+            return cached['spec'], cached['anchors'], cached['headings'], False
+    except (IOError, ValueError, KeyError):
+        pass
+    spec, specAnchors, specHeadings = processSpec(rawSpec)
+    if not config.dryRun:
+        # The cache is only an optimization, so failing to write it isn't an error.
+        try:
+            atomicWrite(path, json.dumps({'hash': hash, 'spec': spec, 'anchors': specAnchors, 'headings': specHeadings}).encode("utf-8"))
+        except (IOError, OSError):
+            pass
+    return spec, specAnchors, specHeadings, True
 
 
-def updateBiblio():
-    say("Downloading biblio data...")
+def specCacheDir():
+    return os.path.join(config.scriptPath, "spec-data", "cache", "specs")
+
+
+def pruneSpecCache(names):
+    # Deletes the cached results of specs that are no longer in the anchor data.
+    try:
+        for filename in os.listdir(specCacheDir()):
+            if filename.endswith(".json") and filename[:-5] not in names:
+                os.remove(os.path.join(specCacheDir(), filename))
+    except OSError:
+        pass
+
+
+def processSpec(rawSpec):
+    # Returns the spec's data, its anchors as [[linking text, anchor]], and its headings.
+    spec = {
+        'vshortname': rawSpec['name'],
+        'shortname': rawSpec.get('short_name'),
+        'TR': rawSpec.get('base_uri'),
+        'ED': rawSpec.get('draft_uri'),
+        'title': rawSpec.get('title'),
+        'description': rawSpec.get('description')
+    }
+    if spec['shortname'] is not None and spec['vshortname'].startswith(spec['shortname']):
+        # S = "foo", V = "foo-3"
+        # Strip the prefix
+        level = spec['vshortname'][len(spec['shortname']):]
+        if level.startswith("-"):
+            level = level[1:]
+        if level.isdigit():
+            spec['level'] = int(level)
+        else:
+            spec['level'] = 1
+    elif spec['shortname'] is None and re.match(r"(.*)-(\d+)", spec['vshortname']):
+        # S = None, V = "foo-3"
+        match = re.match(r"(.*)-(\d+)", spec['vshortname'])
+        spec['shortname'] = match.group(1)
+        spec['level'] = int(match.group(2))
+    else:
+        spec['shortname'] = spec['vshortname']
+        spec['level'] = 1
+    specHeadings = {}
+
+    def setStatus(status):
+        def temp(obj):
+            obj['status'] = status
+            return obj
+        return temp
+    specAnchors = []
+    rawAnchorData = map(setStatus('TR'), linearizeAnchorTree(rawSpec.get('anchors', []))) + map(setStatus('ED'), linearizeAnchorTree(rawSpec.get('draft_anchors',[])))
+    for rawAnchor in rawAnchorData:
+        rawAnchor = fixupAnchor(rawAnchor)
+        linkingTexts = rawAnchor.get('linking_text', [rawAnchor.get('title')])
+        if linkingTexts[0] is None:
+            continue
+        if rawAnchor['type'] == "heading":
+            uri = rawAnchor['uri']
+            if uri.startswith("??"):
+                # css3-tables has this a bunch, for some strange reason
+                uri = uri[2:]
+            if uri[0] == "#":
+                # Either single-page spec, or link on the top page of a multi-page spec
+                heading = {
+                    'url': spec[rawAnchor['status']] + uri,
+                    'number': rawAnchor['name'] if re.match(r"[\d.]+$", rawAnchor['name']) else "",
+                    'text': rawAnchor['title'],
+                    'spec': spec['title']
+                }
+                fragment = uri
+                shorthand = "/"+fragment
+            else:
+                # Multi-page spec, need to guard against colliding IDs
+                if "#" in uri:
+                    # url to a heading in the page, like "foo.html#bar"
+                    match = re.match(r"([\w-]+).*?(#.*)", uri)
+                    if not match:
+                        die("Unexpected URI pattern '{0}' for spec '{1}'. Please report this to the Bikeshed maintainer.", uri, spec['vshortname'])
+                        continue
+                    page, fragment = match.groups()
+                    page = "/"+page
+                else:
+                    # url to a page itself, like "foo.html"
+                    page, _, _ = uri.partition(".")
+                    page = "/"+page
+                    fragment = "#"
+                shorthand = page + fragment
+                heading = {
+                    'url': spec[rawAnchor['status']] + uri,
+                    'number': rawAnchor['name'] if re.match(r"[\d.]+$", rawAnchor['name']) else "",
+                    'text': rawAnchor['title'],
+                    'spec': spec['title']
+                }
+            if shorthand not in specHeadings:
+                specHeadings[shorthand] = {}
+            specHeadings[shorthand][rawAnchor['status']] = heading
+            if fragment not in specHeadings:
+                specHeadings[fragment] = []
+            if shorthand not in specHeadings[fragment]:
+                specHeadings[fragment].append(shorthand)
+        else:
+            anchor = {
+                'status': rawAnchor['status'],
+                'type': rawAnchor['type'],
+                'spec': spec['vshortname'],
+                'shortname': spec['shortname'],
+                'level': int(spec['level']),
+                'export': rawAnchor.get('export', False),
+                'normative': rawAnchor.get('normative', False),
+                'url': spec[rawAnchor['status']] + rawAnchor['uri'],
+                'for': rawAnchor.get('for', [])
+            }
+            for text in linkingTexts:
+                if anchor['type'] in config.lowercaseTypes:
+                    text = text.lower()
+                text = re.sub(r'\s+', ' ', text)
+                specAnchors.append([text, anchor])
+
+    # Headings data was purposely verbose, assuming collisions even when there wasn't one.
+    # Want to keep the collision data for multi-page, so I can tell when you request a non-existent page,
+    # but need to collapse away the collision stuff for single-page.
+    for k, v in specHeadings.items():
+        if k[0] == "#" and len(v) == 1 and v[0][0:2] == "/#":
+            # No collision, and this is either a single-page spec or a non-colliding front-page link
+            # Go ahead and collapse them.
+            specHeadings[k] = specHeadings[v[0]]
+            del specHeadings[v[0]]
+
+    return spec, specAnchors, specHeadings
+
+
+def linearizeAnchorTree(multiTree, list=None):
+    if list is None:
+        list = []
+    # Call with multiTree being a list of trees
+    for item in multiTree:
+        if item['type'] in config.dfnTypes.union(["dfn", "heading"]):
+            list.append(item)
+        if item.get('children'):
+            linearizeAnchorTree(item['children'], list)
+    return list
+
+
+def updateBiblio(state, specrefDownload, csswgDownload):
     biblios = defaultdict(list)
+    responses = []
     try:
-        with closing(urllib2.urlopen("https://specref.herokuapp.com/bibrefs")) as fh:
-            biblio.processSpecrefBiblioFile(unicode(fh.read(), encoding="utf-8"), biblios, order=3)
-        with closing(urllib2.urlopen("https://raw.githubusercontent.com/w3c/csswg-drafts/master/biblio.ref")) as fh:
-            lines = [unicode(line, encoding="utf-8") for line in fh.readlines()]
-            biblio.processReferBiblioFile(lines, biblios, order=4)
+        responses = [specrefDownload.result(), csswgDownload.result()]
+        if state.unchanged("biblio data", responses):
+            say("Biblio data is already up to date.")
+            return
+        biblio.processSpecrefBiblioFile(responses[0].text, biblios, order=3)
+        lines = [unicode(line, encoding="utf-8") for line in io.BytesIO(responses[1].body)]
+        biblio.processReferBiblioFile(lines, biblios, order=4)
     except Exception, e:
         die("Couldn't download the biblio data.\n{0}", e)
     if not config.dryRun:
-        # Group the biblios by the first two letters of their keys
-        groupedBiblios = DefaultOrderedDict(DefaultOrderedDict)
-        allNames = []
+        # All the biblios go in one file, sorted by key,
+        # with an index of where each key's entries are in it.
+        sortedBiblios = DefaultOrderedDict(list)
         for k,v in sorted(biblios.items(), key=lambda x:x[0].lower()):
-            allNames.append(k)
-            group = k[0:2]
-            groupedBiblios[group][k] = v
-        for group, biblios in groupedBiblios.items():
-            try:
-                with io.open(config.scriptPath + "/spec-data/biblio/biblio-{0}.data".format(group), 'w', encoding="utf-8") as fh:
-                    writeBiblioFile(fh, biblios)
-            except Exception, e:
-                die("Couldn't save biblio database to disk.\n{0}", e)
-                return
+            sortedBiblios[k] = v
         try:
-            with io.open(config.scriptPath + "/spec-data/biblio-keys.json", 'w', encoding="utf-8") as fh:
-                fh.write(unicode(json.dumps(allNames, indent=0, ensure_ascii=False, sort_keys=True)))
+            fh = io.StringIO()
+            writeBiblioFile(fh, sortedBiblios)
+            biblioChanged = writeDataFile(config.scriptPath + "/spec-data/biblio.data", fh.getvalue())
         except Exception, e:
             die("Couldn't save biblio database to disk.\n{0}", e)
             return
+        try:
+            if biblioChanged or not os.path.exists(config.scriptPath + "/spec-data/biblio.index"):
+                biblio.writeBiblioIndex(config.scriptPath + "/spec-data/biblio.data", config.scriptPath + "/spec-data/biblio.index")
+        except Exception, e:
+            die("Couldn't save biblio index to disk.\n{0}", e)
+            return
+        if len(responses) == 2:
+            state.record("biblio data", responses)
     say("Success!")
 
 
-def updateLinkDefaults():
+def updateLinkDefaults(state, download):
     try:
-        say("Downloading link defaults...")
-        with closing(urllib2.urlopen("https://raw.githubusercontent.com/tabatkins/bikeshed/master/bikeshed/spec-data/readonly/link-defaults.infotree")) as fh:
-            lines = [unicode(line, encoding="utf-8") for line in fh.readlines()]
+        res = download.result()
+        if state.unchanged("link defaults", [res]):
+            say("Link defaults are already up to date.")
+            return
+        lines = [unicode(line, encoding="utf-8") for line in io.BytesIO(res.body)]
     except Exception, e:
         die("Couldn't download link defaults data.\n{0}", e)
         return
 
     if not config.dryRun:
         try:
-            with io.open(config.scriptPath+"/spec-data/link-defaults.infotree", 'w', encoding="utf-8") as f:
-                f.write(''.join(lines))
+            writeDataFile(config.scriptPath+"/spec-data/link-defaults.infotree", ''.join(lines))
         except Exception, e:
             die("Couldn't save link-defaults database to disk.\n{0}", e)
             return
+        state.record("link defaults", [res])
     say("Success!")
 
-def updateTestSuites():
+def updateTestSuites(state, download):
     try:
-        say("Downloading test suite data...")
-        shepherd = apiclient.APIClient("https://api.csswg.org/shepherd/", version = "vnd.csswg.shepherd.v1")
-        res = shepherd.get("test_suites")
+        res = download.result()
+        if res and res.notModified:
+            say("Test suite data is already up to date.")
+            return
         if ((not res) or (406 == res.status)):
             die("This version of the test suite API is no longer supported. Please update Bikeshed.")
             return
@@ -323,8 +621,8 @@ def updateTestSuites():
 
     if not config.dryRun:
         try:
-            with io.open(config.scriptPath+"/spec-data/test-suites.json", 'w', encoding="utf-8") as f:
-                f.write(unicode(json.dumps(testSuites, ensure_ascii=False, indent=2, sort_keys=True)))
+            writeDataFile(config.scriptPath+"/spec-data/test-suites.json", json.dumps(testSuites, ensure_ascii=False, indent=2, sort_keys=True))
+            state.record("test suite data", [res])
         except Exception, e:
             die("Couldn't save test-suite database to disk.\n{0}", e)
     say("Success!")
@@ -379,6 +677,7 @@ def writeBiblioFile(fh, biblios):
 
 def writeAnchorsFile(fh, anchors):
     '''
+    Takes a list of [key, anchor].
     Keys may be duplicated.
 
     key
@@ -393,20 +692,19 @@ def writeAnchorsFile(fh, anchors):
     for* (one per line, unknown #)
     - (by itself, ends the segment)
     '''
-    for key, entries in anchors.items():
-        for e in entries:
-            fh.write(key + "\n")
-            for field in ["type", "spec", "shortname", "level", "status", "url"]:
-                fh.write(unicode(e.get(field, "")) + "\n")
-            for field in ["export", "normative"]:
-                if e.get(field, False):
-                    fh.write("1\n")
-                else:
-                    fh.write("\n")
-            for forValue in e.get("for", []):
-                if forValue: # skip empty strings
-                    fh.write(forValue+"\n")
-            fh.write("-" + "\n")
+    for key, e in anchors:
+        fh.write(key + "\n")
+        for field in ["type", "spec", "shortname", "level", "status", "url"]:
+            fh.write(unicode(e.get(field, "")) + "\n")
+        for field in ["export", "normative"]:
+            if e.get(field, False):
+                fh.write("1\n")
+            else:
+                fh.write("\n")
+        for forValue in e.get("for", []):
+            if forValue: # skip empty strings
+                fh.write(forValue+"\n")
+        fh.write("-" + "\n")
 
 def fixupDataFiles():
     import os
@@ -446,6 +744,8 @@ def fixupDataFiles():
     except Exception, err:
         warn("Couldn't update datafiles from cache. Bikeshed may be unstable.\n{0}", err)
         return
+    # The data files no longer match what was last downloaded.
+    UpdateState().clear()
 
 def fixupAnchor(anchor):
     # Miscellaneous fixes
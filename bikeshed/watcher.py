@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+import os
+import sys
+import time
+import errno
+import select
+import struct
+
+'''
+Waits for files to change, for watch mode.
+
+On Linux this uses inotify (through ctypes, so there's nothing extra to install),
+watching the directories containing the files,
+so it also notices files being created, deleted, or replaced by a rename,
+as editors often do when saving.
+Elsewhere, or if inotify isn't available, it falls back to polling mtimes.
+
+Either way, a burst of changes (saving several files at once, say)
+is collected into a single wakeup: after the first change,
+it keeps waiting until no more changes arrive for `debounce` seconds.
+
+Call snapshot() before each build, with the files it's known to depend on,
+and the next wait() also catches anything changed while the build was running:
+files in the snapshot that no longer match it,
+and files first seen by wait() that were modified after the snapshot was taken.
+'''
+
+def Watcher():
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return PollingWatcher()
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class BaseWatcher(object):
+    def __init__(self):
+        # {path => mtime, or None if it doesn't exist}, as of the snapshot or the last check
+        self.mtimes = {}
+        # When the snapshot was taken
+        self.snapshotTime = None
+
+    def snapshot(self, paths):
+        self.snapshotTime = time.time()
+        self.mtimes = {path: mtime(path) for path in paths}
+
+    def _changes(self, paths):
+        # Returns the paths whose mtimes changed since they were last checked.
+        changed = set()
+        for path in paths:
+            current = mtime(path)
+            if path in self.mtimes:
+                if current != self.mtimes[path]:
+                    changed.add(path)
+            elif current is not None and self.snapshotTime is not None and current >= self.snapshotTime:
+                changed.add(path)
+            self.mtimes[path] = current
+        return changed
+
+
+class InotifyWatcher(BaseWatcher):
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    eventMask = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    eventHeader = str("iIII")
+    eventHeaderSize = struct.calcsize(eventHeader)
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        BaseWatcher.__init__(self)
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library(str("c")) or str("libc.so.6"), use_errno=True)
+        self._addWatch = libc.inotify_add_watch
+        self._addWatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Couldn't initialize inotify")
+        # {directory => watch descriptor}, and the reverse
+        self.watchedDirs = {}
+        self.dirsByWatch = {}
+
+    def _watchDir(self, dir):
+        if dir in self.watchedDirs:
+            return
+        wd = self._addWatch(self.fd, dir.encode(sys.getfilesystemencoding()), self.eventMask)
+        if wd < 0:
+            # Directory doesn't exist (yet); nothing in it can be read anyway.
+            return
+        self.watchedDirs[dir] = wd
+        self.dirsByWatch[wd] = dir
+
+    def _readEvents(self, timeout):
+        # Returns the paths touched by the next batch of events,
+        # or None if nothing happened within the timeout.
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        data = os.read(self.fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset + self.eventHeaderSize <= len(data):
+            wd, mask, cookie, nameLength = struct.unpack_from(self.eventHeader, data, offset)
+            offset += self.eventHeaderSize
+            name = data[offset:offset+nameLength].rstrip(b"\0").decode(sys.getfilesystemencoding())
+            offset += nameLength
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were dropped, so anything could have changed.
+                paths.add(None)
+            elif wd in self.dirsByWatch:
+                paths.add(os.path.join(self.dirsByWatch[wd], name))
+        return paths
+
+    def snapshot(self, paths):
+        # Watches start now, so changes made during the build are queued up for wait();
+        # anything already queued happened before the build, and is dropped.
+        for path in paths:
+            self._watchDir(os.path.dirname(path))
+        while self._readEvents(0) is not None:
+            pass
+        BaseWatcher.snapshot(self, paths)
+
+    def wait(self, paths, debounce=.1):
+        # Blocks until at least one of the paths changes,
+        # then returns the set of paths that changed.
+        paths = set(paths)
+        for path in paths:
+            self._watchDir(os.path.dirname(path))
+        # Changed during the build (the queued events also show these,
+        # except for files in directories that weren't watched yet).
+        changed = self._changes(paths)
+        while not changed:
+            events = self._readEvents(None)
+            changed = paths.intersection(events)
+            if None in events:
+                changed = paths
+        while True:
+            events = self._readEvents(debounce)
+            if events is None:
+                break
+            changed.update(paths.intersection(events))
+        return changed
+
+
+class PollingWatcher(BaseWatcher):
+    def __init__(self, interval=.5):
+        BaseWatcher.__init__(self)
+        self.interval = interval
+
+    def wait(self, paths, debounce=.1):
+        while True:
+            changed = self._changes(paths)
+            if changed:
+                break
+            time.sleep(self.interval)
+        while True:
+            time.sleep(debounce)
+            moreChanged = self._changes(paths)
+            if not moreChanged:
+                break
+            changed.update(moreChanged)
+        return changed
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+#  Copyright © 2013 Hewlett-Packard Development Company, L.P.
+#
+#  This work is distributed under the W3C® Software License [1]
+#  in the hope that it will be useful, but WITHOUT ANY
+#  WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+#  [1] http://www.w3.org/Consortium/Legal/2002/copyright-software-20021231
+#
+
+# Times the tokenizer and parser over the WebIDL in some files.
+#
+#   python bench.py [-n REPEAT] [--min-chars N] [FILE...]
+#
+# .idl files are used whole; from .py files, the IDL strings assigned to `idl` (as in test.py);
+# from anything else (Bikeshed source, HTML), the contents of <pre class=idl> and <xmp class=idl> blocks.
+# With no files, uses all the IDL in this package's test.py, Bikeshed's tests (../../tests/*.bs), and its docs.
+# Pass a real spec (the HTML standard's source, say) for the most realistic numbers.
+#
+# The blocks are repeated until there are at least --min-chars characters of IDL,
+# so that small corpora still take long enough to time meaningfully.
+
+import sys
+import os
+import re
+import io
+import ast
+import glob
+import time
+import argparse
+
+from widlparser import parser, tokenizer
+
+
+def extractIDL(filename):
+    with io.open(filename, encoding='utf-8') as f:
+        text = f.read()
+    if (filename.endswith('.idl')):
+        return [text]
+    if (filename.endswith('.py')):
+        return extractPythonIDL(text.encode('utf-8'))
+    blocks = re.findall(r'<(pre|xmp)[^>]*\sclass=["\']?[^>]*\bidl\b[^>]*>(.*?)</\1>', text, re.DOTALL)
+    return [re.sub(r'<[^>]*>', '', block) for tag, block in blocks]
+
+def extractPythonIDL(source):
+    strings = {}
+    for node in ast.walk(ast.parse(source)):
+        if (isinstance(node, (ast.Assign, ast.AugAssign)) and isinstance(node.value, ast.Str)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if (any(isinstance(target, ast.Name) and ('idl' == target.id) for target in targets)):
+                strings[node.lineno] = node.value.s
+    return ([u''.join(strings[line] for line in sorted(strings))] if (strings) else [])
+
+def defaultFiles():
+    here = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.join(here, '..', '..')
+    return ([os.path.join(here, 'test.py')] +
+            sorted(glob.glob(os.path.join(root, 'tests', '*.bs'))) + sorted(glob.glob(os.path.join(root, 'docs', '*.md'))))
+
+def bench(label, fn, blocks, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for block in blocks:
+            fn(block)
+        elapsed = time.time() - start
+        best = elapsed if (best is None) else min(best, elapsed)
+    size = sum(len(block) for block in blocks)
+    print '{0:<10} {1:>9.2f}ms {2:>9.0f} characters/ms'.format(label, best * 1000, size / (best * 1000))
+
+
+if __name__ == "__main__":      # called from the command line
+    argparser = argparse.ArgumentParser(description='Time the WebIDL tokenizer and parser.')
+    argparser.add_argument('files', nargs='*')
+    argparser.add_argument('-n', dest='repeat', type=int, default=10, help='Runs to take the best of.')
+    argparser.add_argument('--min-chars', dest='minChars', type=int, default=500000,
+                           help='Repeat the IDL until there is at least this much of it.')
+    options = argparser.parse_args()
+
+    files = options.files or defaultFiles()
+    corpus = []
+    sources = 0
+    for filename in files:
+        found = [block for block in extractIDL(filename) if block.strip()]
+        corpus += found
+        sources += 1 if (found) else 0
+    if (not corpus):
+        print 'No IDL found.'
+        sys.exit(1)
+    corpusSize = sum(len(block) for block in corpus)
+    blocks = corpus * max(1, -(-options.minChars // corpusSize))
+    print '{0} IDL blocks, {1} characters, from {2} files, repeated to {3} characters, best of {4} runs:'.format(
+        len(corpus), corpusSize, sources, sum(len(block) for block in blocks), options.repeat)
+    bench('tokenize', lambda text: tokenizer.Tokenizer(text), blocks, options.repeat)
+    bench('parse', lambda text: parser.Parser(text), blocks, options.repeat)
@@ -14,6 +14,8 @@ from productions import *
 from markup import MarkupGenerator
 
 class Construct(ChildProduction):
+    __slots__ = ('extendedAttributes',)
+
     @classmethod
     def peek(cls, tokens):
         return ExtendedAttributeList.peek(tokens)
@@ -110,6 +112,8 @@ class Construct(ChildProduction):
 
 
 class Const(Construct):    # "const" ConstType identifier "=" ConstValue ";"
+    __slots__ = ('_const', '_equals', 'name', 'type', 'value')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -164,6 +168,8 @@ class Const(Construct):    # "const" ConstType identifier "=" ConstValue ";"
 
 
 class Enum(Construct):    # [ExtendedAttributes] "enum" identifier "{" EnumValueList "}" ";"
+    __slots__ = ('_closeBrace', '_enum', '_openBrace', 'name', 'values')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -210,6 +216,8 @@ class Enum(Construct):    # [ExtendedAttributes] "enum" identifier "{" EnumValue
 
 
 class Typedef(Construct):    # [ExtendedAttributes] "typedef" Type identifier ";"
+    __slots__ = ('_typedef', 'name', 'type')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -249,6 +257,8 @@ class Typedef(Construct):    # [ExtendedAttributes] "typedef" Type identifier ";
 
 class Argument(Construct):    # [ExtendedAttributeList] "optional" [IgnoreInOut] Type ArgumentName [Default] |
                               # [ExtendedAttributeList] [IgnoreInOut] Type ["..."] ArgumentName
+    __slots__ = ('_ignore', '_name', 'default', 'optional', 'type', 'variadic')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -322,6 +332,8 @@ class Argument(Construct):    # [ExtendedAttributeList] "optional" [IgnoreInOut]
 
 
 class InterfaceMember(Construct): # [ExtendedAttributes] Const | Operation | SpecialOperation | Serializer | Stringifier | StaticMember | Iterable | Attribute | Maplike | Setlike
+    __slots__ = ('member',)
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -404,6 +416,8 @@ class InterfaceMember(Construct): # [ExtendedAttributes] Const | Operation | Spe
 
 
 class SyntaxError(Construct):   # ... ";" | ... "}"
+    __slots__ = ('tokens',)
+
     def __init__(self, tokens, parent):
         Construct.__init__(self, tokens, parent, False)
         self.tokens = tokens.syntaxError((';', '}'), False)
@@ -429,6 +443,8 @@ class SyntaxError(Construct):   # ... ";" | ... "}"
 
 
 class Interface(Construct):    # [ExtendedAttributes] ["partial"] "interface" identifier [Inheritance] "{" [InterfaceMember]... "}" ";"
+    __slots__ = ('_closeBrace', '_interface', '_openBrace', 'inheritance', 'members', 'name', 'partial')
+
     @classmethod
     def peek(cls, tokens, acceptExtendedAttributes = True):
         tokens.pushPosition(False)
@@ -565,6 +581,8 @@ class Interface(Construct):    # [ExtendedAttributes] ["partial"] "interface" id
 
 
 class DictionaryMember(Construct): # [ExtendedAttributes] ["required"] Type identifier [Default] ";"
+    __slots__ = ('default', 'name', 'required', 'type')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -617,6 +635,8 @@ class DictionaryMember(Construct): # [ExtendedAttributes] ["required"] Type iden
 
 
 class Dictionary(Construct):  # [ExtendedAttributes] ["partial"] "dictionary" identifier [Inheritance] "{" [DictionaryMember]... "}" ";"
+    __slots__ = ('_closeBrace', '_dictionary', '_openBrace', 'inheritance', 'members', 'name', 'partial')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -727,6 +747,8 @@ class Dictionary(Construct):  # [ExtendedAttributes] ["partial"] "dictionary" id
 
 class Callback(Construct):    # [ExtendedAttributes] "callback" identifier "=" ReturnType "(" [ArgumentList] ")" ";" |
                               # [ExtendedAttributes] "callback" Interface
+    __slots__ = ('_callback', '_closeParen', '_equals', '_openParen', 'arguments', 'interface', 'name', 'returnType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -868,6 +890,8 @@ class Callback(Construct):    # [ExtendedAttributes] "callback" identifier "=" R
 
 
 class ImplementsStatement(Construct):  # [ExtendedAttributes] identifier "implements" identifier ";"
+    __slots__ = ('_implements', 'implements', 'name')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -905,6 +929,8 @@ class ImplementsStatement(Construct):  # [ExtendedAttributes] identifier "implem
 
 
 class ExtendedAttributeUnknown(Construct): # list of tokens
+    __slots__ = ('tokens',)
+
     def __init__(self, tokens, parent):
         Construct.__init__(self, tokens, parent, False)
         skipped = tokens.seekSymbol((',', ']'))
@@ -928,6 +954,8 @@ class ExtendedAttributeUnknown(Construct): # list of tokens
 
 
 class ExtendedAttributeNoArgs(Construct):   # identifier
+    __slots__ = ('attribute',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -965,6 +993,8 @@ class ExtendedAttributeNoArgs(Construct):   # identifier
 
 
 class ExtendedAttributeArgList(Construct):  # identifier "(" [ArgumentList] ")"
+    __slots__ = ('_closeParen', '_openParen', 'arguments', 'attribute')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1015,6 +1045,8 @@ class ExtendedAttributeArgList(Construct):  # identifier "(" [ArgumentList] ")"
 
 
 class ExtendedAttributeIdent(Construct):    # identifier "=" identifier
+    __slots__ = ('_equals', 'attribute', 'value')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1059,6 +1091,8 @@ class ExtendedAttributeIdent(Construct):    # identifier "=" identifier
 
 
 class ExtendedAttributeIdentList(Construct):    # identifier "=" "(" identifier [Identifiers] ")"
+    __slots__ = ('_closeParen', '_equals', '_openParen', 'attribute', 'next', 'value')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1118,6 +1152,8 @@ class ExtendedAttributeIdentList(Construct):    # identifier "=" "(" identifier
 
 
 class ExtendedAttributeNamedArgList(Construct): # identifier "=" identifier "(" [ArgumentList] ")"
+    __slots__ = ('_closeParen', '_equals', '_openParen', 'arguments', 'attribute', 'value')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1176,6 +1212,8 @@ class ExtendedAttributeNamedArgList(Construct): # identifier "=" identifier "("
 
 
 class ExtendedAttributeTypePair(Construct): # identifier "(" Type "," Type ")"
+    __slots__ = ('_closeParen', '_comma', '_openParen', 'attribute', 'keyType', 'valueType')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1228,6 +1266,8 @@ class ExtendedAttributeTypePair(Construct): # identifier "(" Type "," Type ")"
 class ExtendedAttribute(Construct): # ExtendedAttributeNoArgs | ExtendedAttributeArgList |
                                     # ExtendedAttributeIdent | ExtendedAttributeNamedArgList |
                                     # ExtendedAttributeIdentList | ExtendedAttributeTypePair
+    __slots__ = ('attribute',)
+
     @classmethod
     def peek(cls, tokens):
         return (ExtendedAttributeNamedArgList.peek(tokens) or
@@ -18,6 +18,8 @@ def _name(thing):
 
 
 class Production(object):
+    __slots__ = ('_leadingSpace', '_semicolon', '_tail', '_trailingSpace')
+
     def __init__(self, tokens):
         self._leadingSpace = self._whitespace(tokens)
         self._tail = None
@@ -71,6 +73,8 @@ class Production(object):
 
 
 class Symbol(Production):
+    __slots__ = ('symbol',)
+
     @classmethod
     def peek(cls, tokens, symbol):
         token = tokens.pushPosition()
@@ -98,6 +102,8 @@ class Symbol(Production):
 
 
 class IntegerType(Production):   # "short" | "long" ["long"]
+    __slots__ = ('_space', 'type')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -143,6 +149,8 @@ class IntegerType(Production):   # "short" | "long" ["long"]
 
 
 class UnsignedIntegerType(Production):   # "unsigned" IntegerType | IntegerType
+    __slots__ = ('type', 'unsigned')
+
     @classmethod
     def peek(cls, tokens):
         if (IntegerType.peek(tokens)):
@@ -171,6 +179,8 @@ class UnsignedIntegerType(Production):   # "unsigned" IntegerType | IntegerType
 
 
 class FloatType(Production):   # "float" | "double"
+    __slots__ = ('type',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -194,6 +204,8 @@ class FloatType(Production):   # "float" | "double"
 
 
 class UnrestrictedFloatType(Production): # "unrestricted" FloatType | FloatType
+    __slots__ = ('type', 'unrestricted')
+
     @classmethod
     def peek(cls, tokens):
         if (FloatType.peek(tokens)):
@@ -222,6 +234,8 @@ class UnrestrictedFloatType(Production): # "unrestricted" FloatType | FloatType
 
 
 class PrimitiveType(Production): # UnsignedIntegerType | UnrestrictedFloatType | "boolean" | "byte" | "octet"
+    __slots__ = ('type',)
+
     @classmethod
     def peek(cls, tokens):
         if (UnsignedIntegerType.peek(tokens) or UnrestrictedFloatType.peek(tokens)):
@@ -257,6 +271,8 @@ class PrimitiveType(Production): # UnsignedIntegerType | UnrestrictedFloatType |
 
 
 class ConstType(Production): # PrimitiveType [Null] | identifier [Null]
+    __slots__ = ('null', 'type')
+
     @classmethod
     def peek(cls, tokens):
         if (PrimitiveType.peek(tokens)):
@@ -297,6 +313,8 @@ class ConstType(Production): # PrimitiveType [Null] | identifier [Null]
 
 
 class FloatLiteral(Production):  # float | "-Infinity" | "Infinity" | "NaN"
+    __slots__ = ('value',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -324,6 +342,8 @@ class FloatLiteral(Production):  # float | "-Infinity" | "Infinity" | "NaN"
 
 
 class ConstValue(Production):    # "true" | "false" | FloatLiteral | integer | "null"
+    __slots__ = ('value',)
+
     @classmethod
     def peek(cls, tokens):
         if (FloatLiteral.peek(tokens)):
@@ -356,6 +376,8 @@ class ConstValue(Production):    # "true" | "false" | FloatLiteral | integer | "
 
 
 class EnumValue(Production): # string
+    __slots__ = ('value',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -378,6 +400,8 @@ class EnumValue(Production): # string
 
 
 class EnumValueList(Production): # EnumValue ["," EnumValue]... [","]
+    __slots__ = ('_commas', 'values')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -423,6 +447,8 @@ class EnumValueList(Production): # EnumValue ["," EnumValue]... [","]
 
 
 class TypeSuffix(Production):    # "[" "]" [TypeSuffix] | "?" [TypeSuffixStartingWithArray]
+    __slots__ = ('_closeBracket', '_openBracket', 'array', 'null', 'suffix')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -462,6 +488,8 @@ class TypeSuffix(Production):    # "[" "]" [TypeSuffix] | "?" [TypeSuffixStartin
 
 
 class TypeSuffixStartingWithArray(Production):   # "[" "]" [TypeSuffix]
+    __slots__ = ('_closeBracket', '_openBracket', 'suffix')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -486,6 +514,8 @@ class TypeSuffixStartingWithArray(Production):   # "[" "]" [TypeSuffix]
 
 
 class SingleType(Production):    # NonAnyType | "any" [TypeSuffixStartingWithArray]
+    __slots__ = ('suffix', 'type')
+
     @classmethod
     def peek(cls, tokens):
         if (NonAnyType.peek(tokens)):
@@ -525,6 +555,7 @@ class NonAnyType(Production):   # PrimitiveType [TypeSuffix] | "ByteString" [Typ
                                 # "Date" [TypeSuffix] | "RegExp" [TypeSuffix] | "Error" TypeSuffix |
                                 # "DOMException" TypeSuffix | "Promise" "<" ReturnType ">" [Null] | BufferRelatedType [Nulls]
                                 # "FrozenArray" "<" Type ">" [Null]
+    __slots__ = ('_closeType', '_openType', 'null', 'promise', 'sequence', 'suffix', 'type')
 
     BufferRelatedTypes = frozenset(['ArrayBuffer', 'DataView', 'Int8Array', 'Int16Array', 'Int32Array',
                                     'Uint8Array', 'Uint16Array', 'Uint32Array', 'Uint8ClampedArray',
@@ -636,6 +667,8 @@ class NonAnyType(Production):   # PrimitiveType [TypeSuffix] | "ByteString" [Typ
 
 
 class UnionMemberType(Production):   # NonAnyType | UnionType [TypeSuffix] | "any" "[" "]" [TypeSuffix]
+    __slots__ = ('_closeBracket', '_openBracket', 'any', 'suffix', 'type')
+
     @classmethod
     def peek(cls, tokens):
         if (NonAnyType.peek(tokens)):
@@ -690,6 +723,8 @@ class UnionMemberType(Production):   # NonAnyType | UnionType [TypeSuffix] | "an
 
 
 class UnionType(Production): # "(" UnionMemberType ["or" UnionMemberType]... ")"
+    __slots__ = ('_closeParen', '_openParen', '_ors', 'types')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -741,6 +776,8 @@ class UnionType(Production): # "(" UnionMemberType ["or" UnionMemberType]... ")"
 
 
 class Type(Production):  # SingleType | UnionType [TypeSuffix]
+    __slots__ = ('suffix', 'type')
+
     @classmethod
     def peek(cls, tokens):
         if (SingleType.peek(tokens)):
@@ -773,6 +810,8 @@ class Type(Production):  # SingleType | UnionType [TypeSuffix]
 
 
 class IgnoreInOut(Production):  # "in" | "out"
+    __slots__ = ('text',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -791,6 +830,8 @@ class IgnoreInOut(Production):  # "in" | "out"
 
 
 class Ignore(Production):    # "inherits" "getter" | "getraises" "(" ... ")" | "setraises" "(" ... ")" | "raises" "(" ... ")"
+    __slots__ = ('tokens',)
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -828,6 +869,8 @@ class Ignore(Production):    # "inherits" "getter" | "getraises" "(" ... ")" | "
 
 
 class IgnoreMultipleInheritance(Production):    # [, identifier]...
+    __slots__ = ('_comma', 'inherit', 'next')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -859,6 +902,8 @@ class IgnoreMultipleInheritance(Production):    # [, identifier]...
 
 
 class Inheritance(Production):   # ":" identifier [IgnoreMultipleInheritance]
+    __slots__ = ('_colon', '_ignore', 'base')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -891,6 +936,8 @@ class Inheritance(Production):   # ":" identifier [IgnoreMultipleInheritance]
 
 
 class Default(Production):   # "=" ConstValue | "=" string | "=" "[" "]"
+    __slots__ = ('_closeBracket', '_equals', '_openBracket', 'value')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -938,6 +985,8 @@ class Default(Production):   # "=" ConstValue | "=" string | "=" "[" "]"
 
 
 class ArgumentName(Production):   # identifier | ArgumentNameKeyword
+    __slots__ = ('name',)
+
     ArgumentNameKeywords = frozenset(['attribute', 'callback', 'const', 'creator', 'deleter', 'dictionary', 'enum',
                                       'getter', 'implements', 'inherit', 'interface', 'iterable', 'legacycaller',
                                       'legacyiterable', 'maplike', 'partial', 'required', 'serializer', 'setlike',
@@ -964,6 +1013,8 @@ class ArgumentName(Production):   # identifier | ArgumentNameKeyword
 
 
 class ArgumentList(Production):    # Argument ["," Argument]...
+    __slots__ = ('_commas', 'arguments')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1045,6 +1096,8 @@ class ArgumentList(Production):    # Argument ["," Argument]...
 
 
 class ReturnType(Production):    # Type | "void"
+    __slots__ = ('type',)
+
     @classmethod
     def peek(cls, tokens):
         if (Type.peek(tokens)):
@@ -1076,6 +1129,8 @@ class ReturnType(Production):    # Type | "void"
 
 
 class Special(Production):   # "getter" | "setter" | "creator" | "deleter" | "legacycaller"
+    __slots__ = ('name',)
+
     SpecialSymbols = frozenset(['getter', 'setter', 'creator', 'deleter', 'legacycaller'])
     @classmethod
     def peek(cls, tokens):
@@ -1099,6 +1154,8 @@ class Special(Production):   # "getter" | "setter" | "creator" | "deleter" | "le
 
 
 class AttributeRest(Production):   # ["readonly"] "attribute" Type ("required" | identifier) [Ignore] ";"
+    __slots__ = ('_attribute', '_ignore', 'name', 'readonly', 'type')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1145,6 +1202,8 @@ class AttributeRest(Production):   # ["readonly"] "attribute" Type ("required" |
 
 
 class ChildProduction(Production):
+    __slots__ = ('parent',)
+
     def __init__(self, tokens, parent):
         Production.__init__(self, tokens)
         self.parent = parent
@@ -1167,6 +1226,8 @@ class ChildProduction(Production):
 
 
 class Attribute(ChildProduction):   # ["inherit"] AttributeRest
+    __slots__ = ('attribute', 'inherit')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1211,6 +1272,8 @@ class Attribute(ChildProduction):   # ["inherit"] AttributeRest
 
 
 class OperationRest(ChildProduction):   # [identifier] "(" [ArgumentList] ")" [Ignore] ";"
+    __slots__ = ('_closeParen', '_ignore', '_openParen', 'arguments', 'name')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1262,6 +1325,8 @@ class OperationRest(ChildProduction):   # [identifier] "(" [ArgumentList] ")" [I
 
 
 class Iterable(ChildProduction):     # "iterable" "<" Type ["," Type] ">" ";" | "legacyiterable" "<" Type ">" ";"
+    __slots__ = ('_closeType', '_comma', '_iterable', '_openType', 'keyType', 'type', 'valueType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1340,6 +1405,8 @@ class Iterable(ChildProduction):     # "iterable" "<" Type ["," Type] ">" ";" |
 
 
 class Maplike(ChildProduction):      # ["readonly"] "maplike" "<" Type "," Type ">" ";"
+    __slots__ = ('_closeType', '_comma', '_maplike', '_openType', 'keyType', 'readonly', 'valueType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1399,6 +1466,8 @@ class Maplike(ChildProduction):      # ["readonly"] "maplike" "<" Type "," Type
 
 
 class Setlike(ChildProduction):      # ["readonly"] "setlike" "<" Type ">" ";"
+    __slots__ = ('_closeType', '_openType', '_setlike', 'readonly', 'type')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1450,6 +1519,8 @@ class Setlike(ChildProduction):      # ["readonly"] "setlike" "<" Type ">" ";"
 
 
 class SpecialOperation(ChildProduction):    # Special [Special]... ReturnType OperationRest
+    __slots__ = ('operation', 'returnType', 'specials')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1510,6 +1581,8 @@ class SpecialOperation(ChildProduction):    # Special [Special]... ReturnType Op
 
 
 class Operation(ChildProduction):   # ReturnType OperationRest
+    __slots__ = ('operation', 'returnType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1560,6 +1633,8 @@ class Operation(ChildProduction):   # ReturnType OperationRest
 
 
 class Stringifier(ChildProduction): # "stringifier" AttributeRest | "stringifier" ReturnType OperationRest | "stringifier" ";"
+    __slots__ = ('_stringifier', 'attribute', 'operation', 'returnType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1644,6 +1719,8 @@ class Stringifier(ChildProduction): # "stringifier" AttributeRest | "stringifier
 
 
 class Identifiers(Production):  # "," identifier ["," identifier]...
+    __slots__ = ('_comma', 'name', 'next')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1671,6 +1748,8 @@ class Identifiers(Production):  # "," identifier ["," identifier]...
 
 class SerializationPatternMap(Production):  # "getter" | "attribute" | "inherit" "," "attribute" |
                                             # "inherit" [Identifiers] | identifier [Identifiers]
+    __slots__ = ('_attribute', '_comma', '_getter', '_inherit', 'name', 'next')
+
     @classmethod
     def peek(cls, tokens):
         if (Symbol.peek(tokens, 'getter')):
@@ -1754,6 +1833,8 @@ class SerializationPatternMap(Production):  # "getter" | "attribute" | "inherit"
 
 
 class SerializationPatternList(Production): # "getter" | identifer [Identifiers]
+    __slots__ = ('_getter', 'name', 'next')
+
     @classmethod
     def peek(cls, tokens):
         if (Symbol.peek(tokens, 'getter')):
@@ -1799,6 +1880,8 @@ class SerializationPatternList(Production): # "getter" | identifer [Identifiers]
 
 
 class SerializationPattern(Production): # "{" [SerializationPatternMap] "}" | "[" [SerializationPatternList] "]" | identifier
+    __slots__ = ('_close', '_open', 'name', 'pattern')
+
     @classmethod
     def peek(cls, tokens):
         token = tokens.pushPosition()
@@ -1856,6 +1939,8 @@ class SerializationPattern(Production): # "{" [SerializationPatternMap] "}" | "[
 
 
 class Serializer(ChildProduction):  # "serializer" [OperationRest] ";" | "serializer" "=" SerializationPattern ";"
+    __slots__ = ('_equals', '_serializer', 'operation', 'pattern')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -1937,6 +2022,8 @@ class Serializer(ChildProduction):  # "serializer" [OperationRest] ";" | "serial
 
 
 class StaticMember(ChildProduction):    # "static" AttributeRest | "static" ReturnType OperationRest
+    __slots__ = ('_static', 'attribute', 'operation', 'returnType')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -2014,6 +2101,8 @@ class StaticMember(ChildProduction):    # "static" AttributeRest | "static" Retu
 
 
 class ExtendedAttributeList(ChildProduction):   # "[" ExtendedAttribute ["," ExtendedAttribute]... "]"
+    __slots__ = ('_closeBracket', '_commas', '_openBracket', 'attributes')
+
     @classmethod
     def peek(cls, tokens):
         tokens.pushPosition(False)
@@ -13,13 +13,19 @@
 import re
 import collections
 
+# Token types, numbered to match the groups of Tokenizer.TokenPattern
+FLOAT, INTEGER, IDENTIFIER, STRING, WHITESPACE, SYMBOL, OTHER = range(1, 8)
+TypeNames = (None, 'float', 'integer', 'identifier', 'string', 'whitespace', 'symbol', 'other')
+
 class Token(object):
+    __slots__ = ('type', 'text')
+
     def __init__(self, type, text):
         self.type = type
         self.text = text
     
     def isSymbol(self, symbol = None):
-        if ('symbol' == self.type):
+        if (SYMBOL == self.type):
             if (symbol):
                 if isinstance(symbol, basestring):
                     return (symbol == self.text)
@@ -28,25 +34,25 @@ class Token(object):
         return False
 
     def isIdentifier(self):
-        return ('identifier' == self.type)
+        return (IDENTIFIER == self.type)
     
     def isFloat(self):
-        return ('float' == self.type)
+        return (FLOAT == self.type)
     
     def isInteger(self):
-        return ('integer' == self.type)
+        return (INTEGER == self.type)
     
     def isString(self):
-        return ('string' == self.type)
+        return (STRING == self.type)
     
     def isWhitespace(self):
-        return ('whitespace' == self.type)
+        return (WHITESPACE == self.type)
     
     def __unicode__(self):
         return self.text
 
     def __repr__(self):
-        return '[' + self.type + ':' + self.text.encode('ascii', 'replace') + ']'
+        return '[' + TypeNames[self.type] + ':' + self.text.encode('ascii', 'replace') + ']'
 
 
 
@@ -69,44 +75,34 @@ class Tokenizer(object):
         self.lineNumber = 1
         self._tokenize(text)
 
+    # Alternatives are tried in order at each position, so earlier ones take precedence
+    # (e.g. "1.5" is a float rather than an integer followed by more tokens).
+    TokenPattern = re.compile(r'''
+        (?P<float>-?(?:(?:[0-9]+\.[0-9]*|[0-9]*\.[0-9]+)(?:[Ee][+-]?[0-9]+)?|[0-9]+[Ee][+-]?[0-9]+))
+        |(?P<integer>-?(?:0[Xx][0-9A-Fa-f]+|0[0-7]*|[1-9][0-9]*))
+        |(?P<identifier>_?[A-Z_a-z][0-9A-Z_a-z]*)
+        |(?P<string>"[^"]*")
+        |(?P<whitespace>(?:\s+|//[^\n\r]*|/\*.*?\*/)+)
+        |(?P<symbol>-Infinity|-|,|;|:|\?|\.\.\.|\.|\(|\)|\[|\]|\{|\}|\<|=|\>)
+        |(?P<other>[^\s0-9A-Z_a-z])
+        ''', re.DOTALL | re.VERBOSE)
+
     def _tokenize(self, text):
-        while (0 < len(text)):
-            match = re.match(r'(-?(([0-9]+\.[0-9]*|[0-9]*\.[0-9]+)([Ee][+-]?[0-9]+)?|[0-9]+[Ee][+-]?[0-9]+))(.*)', text, re.DOTALL)
-            if (match):
-                self.tokens.append(Token('float', match.group(1)))
-                text = match.group(5)
-                continue
-            match = re.match(r'(-?(0[Xx][0-9A-Fa-f]+|0[0-7]*|[1-9][0-9]*))(.*)', text, re.DOTALL)
-            if (match):
-                self.tokens.append(Token('integer', match.group(1)))
-                text = match.group(3)
-                continue
-            match = re.match(r'(_?[A-Z_a-z][0-9A-Z_a-z]*)(.*)', text, re.DOTALL)
-            if (match):
-                if (match.group(1) in self.SymbolIdents):
-                    self.tokens.append(Token('symbol', match.group(1)))
-                else:
-                    self.tokens.append(Token('identifier', match.group(1)))
-                text = match.group(2)
-                continue
-            match = re.match(r'("[^"]*")(.*)', text, re.DOTALL)
-            if (match):
-                self.tokens.append(Token('string', match.group(1)))
-                text = match.group(2)
-                continue
-            match = re.match(r'((\s+|//[^\n\r]*|/\*.*?\*/)+)(.*)', text, re.DOTALL)
-            if (match):
-                self.tokens.append(Token('whitespace', match.group(1)))
-                text = match.group(3)
-                continue
-            match = re.match(r'(-Infinity|-|,|;|:|\?|\.\.\.|\.|\(|\)|\[|\]|\{|\}|\<|=|\>)(.*)', text, re.DOTALL)
-            if (match):
-                self.tokens.append(Token('symbol', match.group(1)))
-                text = match.group(2)
-                continue
-            match = re.match(r'([^\s0-9A-Z_a-z])(.*)', text, re.DOTALL)
-            self.tokens.append(Token('other', match.group(1)))
-            text = match.group(2)
+        # Walks the text by offset, rather than slicing off each token,
+        # so tokenizing is linear in the length of the text.
+        match = self.TokenPattern.match
+        append = self.tokens.append
+        symbolIdents = self.SymbolIdents
+        pos = 0
+        end = len(text)
+        while (pos < end):
+            m = match(text, pos)
+            type = m.lastindex
+            value = m.group(type)
+            if ((IDENTIFIER == type) and (value in symbolIdents)):
+                type = SYMBOL
+            append(Token(type, value))
+            pos = m.end()
 
     def __unicode__(self):
         return u''.join([unicode(token) for token in self.tokens])